@@ -0,0 +1,302 @@
+"""
+Benchmarks of the hot paths of galaxy_model: construction of the spiral arms
+and the Galaxy, location checks, adding/removing coordinates, and plotting.
+
+For each benchmark, the best wall time over a few runs and the peak memory
+allocated during one run (tracemalloc, which also traces NumPy) are
+recorded. The results are written as JSON, by default into
+benchmarks/results/<git commit>.json, so that runs of different commits
+(on the same machine) can be compared:
+
+    python benchmarks/run_benchmarks.py [--quick] [--filter classify]
+    python benchmarks/run_benchmarks.py --compare OLD.json NEW.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import lru_cache
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt # noqa
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_DIR)
+
+from galaxy_model.galaxy import Galaxy # noqa
+from galaxy_model.spiral_arms.local import LocalArm # noqa
+from galaxy_model.spiral_arms.norma_outer import NormaOuterArm # noqa
+from galaxy_model.spiral_arms.perseus import PerseusArm # noqa
+from galaxy_model.spiral_arms.sct_cen import SctCenArm # noqa
+from galaxy_model.spiral_arms.sgr_car import SgrCarArm # noqa
+from galaxy_model.spiral_arms.three_kpc import ThreeKpcArm # noqa
+
+ARM_CLASSES = (ThreeKpcArm, NormaOuterArm, SctCenArm, SgrCarArm, PerseusArm,
+               LocalArm)
+
+
+class Benchmark:
+    """
+    Parameters
+    ----------
+    name: str
+    func: callable
+        the code being measured, called with the return value of setup
+    setup: callable (optional)
+        prepares the arguments of func (not measured), called before
+        every run
+    repeat: int
+        number of timed runs; the best one is recorded
+    """
+
+    def __init__(self, name, func, setup=None, repeat=3):
+        self.name = name
+        self.func = func
+        self.setup = setup or tuple
+        self.repeat = repeat
+
+    def run(self):
+        times = []
+        for _ in range(self.repeat):
+            args = self.setup()
+            start = time.perf_counter()
+            self.func(*args)
+            times.append(time.perf_counter() - start)
+        # tracing slows the run down, so the memory is measured separately
+        args = self.setup()
+        tracemalloc.start()
+        self.func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {'time_s': min(times), 'peak_mib': peak / 2**20}
+
+
+def _random_coords(num_coords, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-16, 16, num_coords), rng.uniform(-16, 16, num_coords)
+
+
+def _plot(gal, **kwargs):
+    gal.plot(**kwargs)
+    plt.gcf().canvas.draw()
+    plt.close('all')
+
+
+def benchmarks(cache_dir, quick=False):
+    """
+    Parameters
+    ----------
+    cache_dir: str
+        (empty) directory for the geometry cache benchmarks
+    quick: bool
+        smaller sizes only, e.g. for a quick check
+
+    Returns
+    -------
+    list of Benchmark
+    """
+    max_exponent = 6 if quick else 7
+    # the per-coordinate API is too slow for the biggest sizes
+    max_exponent_per_coord = 4 if quick else 5
+
+    # the shared galaxies and coordinates are built on the first setup that
+    # needs them, so that the benchmarks left out by --filter cost nothing
+    @lru_cache(maxsize=None)
+    def cached_galaxy(**kwargs):
+        return Galaxy(geometry_cache_dir=cache_dir, **kwargs)
+
+    @lru_cache(maxsize=None)
+    def gridded_galaxy():
+        gal = cached_galaxy()
+        gal.build_lookup_grid()
+        return gal
+
+    random_coords = lru_cache(maxsize=None)(_random_coords)
+
+    def warm_cache():
+        cached_galaxy()
+        return ()
+
+    suite = []
+    for arm_class in ARM_CLASSES:
+        suite.append(Benchmark("construct_arm[{}]".format(arm_class.__name__),
+                               arm_class))
+    suite.append(Benchmark("construct_galaxy[no_cache]", Galaxy))
+    suite.append(Benchmark("construct_galaxy[warm_cache]",
+                           lambda: Galaxy(geometry_cache_dir=cache_dir),
+                           warm_cache))
+    suite.append(Benchmark("construct_galaxy[angular_step=3]",
+                           lambda: Galaxy(angular_step=3)))
+    suite.append(Benchmark("construct_galaxy[max_boundary_error=0.02]",
+                           lambda: Galaxy(max_boundary_error=0.02)))
+
+    def simplified_galaxy():
+        return cached_galaxy(max_boundary_error=0.02)
+
+    suite.append(Benchmark(
+        "classify[batch,max_boundary_error=0.02,1e{}]".format(
+            max_exponent - 1),
+        lambda gal, x, y: gal.isOnSpiralArmOrSpurBatch(x, y),
+        lambda: (simplified_galaxy(),
+                 *random_coords(10**(max_exponent - 1))),
+        repeat=1))
+    suite.append(Benchmark(
+        "build_lookup_grid[max_boundary_error=0.02]",
+        lambda gal: gal.build_lookup_grid(), lambda: (simplified_galaxy(),)))
+
+    for exponent in range(2, max_exponent + 1):
+        num_coords = 10**exponent
+        repeat = 3 if exponent < 6 else 1
+        if exponent <= max_exponent_per_coord:
+            suite.append(Benchmark(
+                "classify[per_coord,1e{}]".format(exponent),
+                lambda gal, x, y: gal.isOnSpiralArmOrSpur(x, y),
+                lambda n=num_coords: (gridded_galaxy(), *map(
+                    list, random_coords(n))),
+                repeat=1))
+        suite.append(Benchmark(
+            "classify[batch,1e{}]".format(exponent),
+            lambda gal, x, y: gal.isOnSpiralArmOrSpurBatch(x, y),
+            lambda n=num_coords: (gridded_galaxy(), *random_coords(n)),
+            repeat=repeat))
+        suite.append(Benchmark(
+            "classify[lookup_grid,1e{}]".format(exponent),
+            lambda gal, x, y: gal.isOnSpiralArmOrSpurBatch(
+                x, y, use_lookup_grid=True),
+            lambda n=num_coords: (gridded_galaxy(), *random_coords(n)),
+            repeat=repeat))
+
+    def empty_galaxy():
+        return Galaxy(geometry_cache_dir=cache_dir)
+
+    for exponent in range(4, max_exponent):
+        num_coords = 10**exponent
+
+        def full_galaxy(n=num_coords):
+            gal = empty_galaxy()
+            x, y = random_coords(n)
+            gal.add_coord(x, y)
+            return gal, x, y
+
+        suite.append(Benchmark(
+            "add_coord[1e{}]".format(exponent),
+            lambda gal, x, y: gal.add_coord(x, y),
+            lambda n=num_coords: (empty_galaxy(), *random_coords(n))))
+        suite.append(Benchmark(
+            "remove_coord[1e{}]".format(exponent),
+            lambda gal, x, y: gal.remove_coord(x, y), full_galaxy))
+
+    def galaxy_with_sources(num_coords):
+        def setup():
+            gal = empty_galaxy()
+            gal.add_coord(*_random_coords(num_coords))
+            return (gal,)
+        return setup
+
+    suite.append(Benchmark("plot[no_sources]", _plot,
+                           lambda: (empty_galaxy(),)))
+    suite.append(Benchmark("plot[scatter,1e4]",
+                           lambda gal: _plot(gal, plotSrc=True),
+                           galaxy_with_sources(10**4)))
+    suite.append(Benchmark(
+        "plot[density,1e{}]".format(max_exponent - 1),
+        lambda gal: _plot(gal, plotSrc=True, srcMode='density'),
+        galaxy_with_sources(10**(max_exponent - 1))))
+    return suite
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(quick=False, name_filter=None):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        results = {}
+        for benchmark in benchmarks(cache_dir, quick):
+            if name_filter and name_filter not in benchmark.name:
+                continue
+            results[benchmark.name] = benchmark.run()
+            print("{:<48} {:>10.4f} s {:>10.1f} MiB".format(
+                benchmark.name, results[benchmark.name]['time_s'],
+                results[benchmark.name]['peak_mib']), flush=True)
+    return {'commit': _git_commit(),
+            'date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'machine': platform.platform(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'quick': quick,
+            'results': results}
+
+
+def compare(old_path, new_path, threshold=0.2):
+    """
+    Print the ratios new/old of the results common to both files, flagging
+    the ones more than threshold slower (or bigger) as regressions.
+    Times below 1 ms and peaks below 1 MiB are counted as 1 ms and 1 MiB,
+    as they are mostly noise.
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print("{} ({}) -> {} ({})".format(old['commit'], old['date'],
+                                      new['commit'], new['date']))
+    num_regressions = 0
+    for name, new_result in new['results'].items():
+        if name not in old['results']:
+            continue
+        ratios = {key: max(new_result[key], floor)
+                  / max(old['results'][name][key], floor)
+                  for key, floor in (('time_s', 1e-3), ('peak_mib', 1))}
+        flags = [key for key, ratio in ratios.items()
+                 if ratio > 1 + threshold]
+        num_regressions += len(flags) > 0
+        print("{:<48} time x{:<8.2f} memory x{:<8.2f} {}".format(
+            name, ratios['time_s'], ratios['peak_mib'],
+            "REGRESSION ({})".format(", ".join(flags)) if flags else ""
+        ).rstrip())
+    return num_regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--quick", action="store_true",
+                        help="smaller sizes only")
+    parser.add_argument("--filter", help="only run benchmarks whose name "
+                        "contains this string")
+    parser.add_argument("--output", help="JSON file of the results "
+                        "(default: benchmarks/results/<git commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two JSON files of results instead")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    report = run(args.quick, args.filter)
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results",
+        "{}.json".format(report['commit']))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("results written to {}".format(output))
+
+
+if __name__ == "__main__":
+    main()
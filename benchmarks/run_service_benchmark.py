@@ -0,0 +1,166 @@
+"""
+Throughput and latency of the local classification service
+(galaxy_model/service.py), with a number of concurrent clients sending small
+requests, against building a Galaxy and classifying per request in-process.
+
+The service is started as a subprocess on a UNIX socket in a temporary
+directory, i.e. no network access is needed:
+
+    python benchmarks/run_service_benchmark.py [--clients 8] [--requests 200]
+        [--size 100] [--max-delay-ms 2] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+import numpy as np
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_DIR)
+
+from galaxy_model.service_client import ClassificationClient # noqa
+
+
+def _random_coords(num_coords, rng):
+    return rng.uniform(-16, 16, num_coords), rng.uniform(-16, 16, num_coords)
+
+
+def _latency_summary(latencies_s):
+    latencies_ms = 1000 * np.asarray(latencies_s)
+    return {'p50_ms': np.percentile(latencies_ms, 50),
+            'p95_ms': np.percentile(latencies_ms, 95),
+            'p99_ms': np.percentile(latencies_ms, 99),
+            'max_ms': latencies_ms.max()}
+
+
+def run_in_process(num_requests, size, seed=0):
+    """
+    What a pipeline stage pays without the service: Galaxy() construction
+    and the per-coordinate classification, for every request.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        from galaxy_model.galaxy import Galaxy
+        rng = np.random.default_rng(seed)
+        latencies = []
+        for _ in range(num_requests):
+            x, y = _random_coords(size, rng)
+            start = time.perf_counter()
+            Galaxy().isOnSpiralArmOrSpur(list(x), list(y))
+            latencies.append(time.perf_counter() - start)
+    return dict(_latency_summary(latencies),
+                requests_per_s=num_requests / sum(latencies),
+                coords_per_s=num_requests * size / sum(latencies))
+
+
+def run_service(socket_path, num_clients, num_requests, size, seed=0):
+    """
+    num_clients threads, each with its own connection, sending num_requests
+    requests of size coordinates one after another.
+    """
+    latencies = [[] for _ in range(num_clients)]
+    clients = [ClassificationClient(socket_path=socket_path)
+               for _ in range(num_clients)]
+    stats_before = clients[0].info()['stats']
+
+    def client_loop(i):
+        rng = np.random.default_rng(seed + i)
+        for _ in range(num_requests):
+            x, y = _random_coords(size, rng)
+            start = time.perf_counter()
+            clients[i].classify(x, y)
+            latencies[i].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client_loop, args=(i,))
+               for i in range(num_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stats_after = clients[0].info()['stats']
+    for client in clients:
+        client.close()
+
+    total_requests = num_clients * num_requests
+    num_batches = stats_after['batches'] - stats_before['batches']
+    return dict(_latency_summary(np.concatenate(latencies)),
+                requests_per_s=total_requests / elapsed,
+                coords_per_s=total_requests * size / elapsed,
+                batches=num_batches,
+                requests_per_batch=total_requests / max(num_batches, 1))
+
+
+def _print_result(name, result):
+    print("{:<12} {:>10.1f} req/s {:>12.0f} coords/s   latency p50 {:.2f} ms"
+          "  p95 {:.2f} ms  p99 {:.2f} ms".format(
+              name, result['requests_per_s'], result['coords_per_s'],
+              result['p50_ms'], result['p95_ms'], result['p99_ms']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=8,
+                        help="number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="number of requests per client")
+    parser.add_argument("--size", type=int, default=100,
+                        help="number of coordinates per request")
+    parser.add_argument("--max-delay-ms", type=float, default=2,
+                        help="see galaxy_model/service.py")
+    parser.add_argument("--in-process-requests", type=int, default=10,
+                        help="number of requests of the in-process baseline")
+    parser.add_argument("--output", help="JSON file of the results")
+    args = parser.parse_args()
+
+    report = {'clients': args.clients, 'requests': args.requests,
+              'size': args.size, 'max_delay_ms': args.max_delay_ms}
+    report['in_process'] = run_in_process(args.in_process_requests,
+                                          args.size)
+    _print_result("in-process", report['in_process'])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = os.path.join(tmp_dir, "galaxy_model.sock")
+        env = dict(os.environ, PYTHONWARNINGS='ignore')
+        env['PYTHONPATH'] = os.pathsep.join(
+            filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "galaxy_model.service",
+             "--socket", socket_path,
+             "--max-delay-ms", str(args.max_delay_ms)],
+            cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL)
+        try:
+            start = time.perf_counter()
+            ClassificationClient(socket_path=socket_path,
+                                 connect_timeout=60).close()
+            report['service_startup_s'] = time.perf_counter() - start
+            # one client first, i.e. no concurrent requests to batch
+            report['service_1_client'] = run_service(
+                socket_path, 1, args.requests, args.size)
+            _print_result("1 client", report['service_1_client'])
+            report['service'] = run_service(
+                socket_path, args.clients, args.requests, args.size)
+            _print_result("{} clients".format(args.clients),
+                          report['service'])
+            print("{:.1f} requests per batch".format(
+                report['service']['requests_per_batch']))
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print("results written to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+This module computes arm-local coordinates of arbitrary points: the nearest
+spiral arm, the signed perpendicular offset from its spine, and the azimuth B
+along the spine, using a KD-tree over the spine samples of the arms.
+"""
+
+import numpy as np
+
+
+class ArmCoordinateIndex:
+    """
+    Parameters
+    ----------
+    spiral_arms: list
+        spiral arm objects (see spiral_arms folder)
+    num_neighbours: int
+        number of nearest spine samples whose adjacent spine segments are
+        checked for the perpendicular distance; the spines are sampled densely
+        (1 deg steps), so a few are enough
+    chunk_size: int
+        number of points queried at a time, which bounds the memory of the
+        temporary (chunk_size, 2*num_neighbours) arrays
+
+    Methods
+    -------
+    query(x: array_like, y: array_like)
+        arm-local coordinates of the points, see Galaxy.armLocalCoordinates
+    """
+
+    def __init__(self, spiral_arms, num_neighbours=8, chunk_size=100000):
+        assert chunk_size > 0
+        from scipy.spatial import cKDTree
+        self.arm_names = []
+        x_samples, y_samples, B_samples, w_samples, part_ids, arm_ids = \
+            [], [], [], [], [], []
+        num_parts = 0
+        for arm_id, arm_obj in enumerate(spiral_arms):
+            self.arm_names.append(repr(arm_obj))
+            # ThreeKpc arm has two (half-circle) parts
+            if repr(arm_obj) == "ThreeKpc":
+                parts = zip(arm_obj.x_spine, arm_obj.y_spine,
+                            arm_obj._B_spine, arm_obj._width_kpc)
+            else:
+                parts = [(arm_obj.x_spine, arm_obj.y_spine,
+                          arm_obj._B_spine, arm_obj._width_kpc)]
+            for x_spine, y_spine, B_spine, width_kpc in parts:
+                x_samples.append(np.asarray(x_spine, dtype=float))
+                y_samples.append(np.asarray(y_spine, dtype=float))
+                B_samples.append(np.asarray(B_spine, dtype=float))
+                w_samples.append(np.asarray(width_kpc, dtype=float))
+                part_ids.append(np.full(len(x_spine), num_parts))
+                arm_ids.append(np.full(len(x_spine), arm_id))
+                num_parts += 1
+
+        self._x = np.concatenate(x_samples)
+        self._y = np.concatenate(y_samples)
+        self._B = np.concatenate(B_samples)
+        self._width = np.concatenate(w_samples)
+        self._arm_id = np.concatenate(arm_ids)
+        part_id = np.concatenate(part_ids)
+        # segment i runs from sample i to sample i+1, unless those belong
+        # to different arms (or parts of an arm)
+        self._valid_segment = np.append(part_id[:-1] == part_id[1:], False)
+        self._tree = cKDTree(np.column_stack((self._x, self._y)))
+        self.num_neighbours = min(num_neighbours, len(self._x))
+        self.chunk_size = chunk_size
+
+    def query(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        assert x.shape == y.shape
+        shape = x.shape
+        x = x.ravel()
+        y = y.ravel()
+
+        # the points are queried chunk by chunk, so that the (n, 2k)
+        # temporary arrays stay bounded by chunk_size points
+        arm_id = np.empty(len(x), dtype=self._arm_id.dtype)
+        offset_kpc = np.empty(len(x))
+        offset_width = np.empty(len(x))
+        B = np.empty(len(x))
+        for start in range(0, len(x), self.chunk_size):
+            chunk = slice(start, start+self.chunk_size)
+            arm_id[chunk], offset_kpc[chunk], offset_width[chunk], B[chunk] = \
+                self._query_chunk(x[chunk], y[chunk])
+
+        arm = np.asarray(self.arm_names)[arm_id]
+        return {'arm': arm.reshape(shape),
+                'offset_kpc': offset_kpc.reshape(shape),
+                'offset_width': offset_width.reshape(shape),
+                'B': B.reshape(shape)}
+
+    def _query_chunk(self, x, y):
+        _, neighbours = self._tree.query(np.column_stack((x, y)),
+                                         k=self.num_neighbours)
+        neighbours = neighbours.reshape(len(x), -1)
+        # segments adjacent to the nearest samples: (n, 2k)
+        segments = np.concatenate((neighbours - 1, neighbours), axis=1)
+        segments = np.clip(segments, 0, len(self._x) - 2)
+        valid = self._valid_segment[segments]
+
+        x_start, y_start = self._x[segments], self._y[segments]
+        dx = self._x[segments + 1] - x_start
+        dy = self._y[segments + 1] - y_start
+        px = x[:, np.newaxis] - x_start
+        py = y[:, np.newaxis] - y_start
+        t = np.clip((px*dx + py*dy) / (dx*dx + dy*dy), 0, 1)
+        distance = np.hypot(px - t*dx, py - t*dy)
+        distance[~valid] = np.inf
+
+        nearest = np.argmin(distance, axis=1)
+        rows = np.arange(len(x))
+        segment = segments[rows, nearest]
+        t = t[rows, nearest]
+        distance = distance[rows, nearest]
+        # points on the left of the spine direction (increasing B) are on
+        # the inner side, i.e. towards the Galactic Centre
+        cross = dx[rows, nearest]*py[rows, nearest] \
+            - dy[rows, nearest]*px[rows, nearest]
+        offset_kpc = np.where(cross > 0, -distance, distance)
+        B = self._B[segment] + t*(self._B[segment + 1] - self._B[segment])
+        width = self._width[segment] \
+            + t*(self._width[segment + 1] - self._width[segment])
+        return self._arm_id[segment], offset_kpc, offset_kpc/width, B
@@ -0,0 +1,89 @@
+"""
+This module converts heliocentric Galactic coordinates (glon, glat, distance)
+into the cartesian frame of this Galaxy model, using NumPy only.
+
+The model frame is astropy's Galactocentric frame with the axes swapped as
+(y, -x, z), i.e. the Galactic Centre at (0, 0) and the Sun at
+(0, ~solar_dist). The default solar parameters (8.15 kpc from the Galactic
+Centre, 5.5 pc above the mid-plane) are the ones used throughout this model.
+"""
+
+import numpy as np
+
+# Galactic pole and longitude of the celestial pole (FK5, J2000), which
+# define the Galactic frame; same values as astropy
+_RA_NGP = 192.85948
+_DEC_NGP = 27.12825
+_LON_NCP = 122.932
+
+# ICRS position of Sgr A* and the roll angle aligning the Galactocentric
+# x-z plane with the Galactic one; astropy's (v4.0) Galactocentric defaults
+_GALCEN_RA = 266.4051
+_GALCEN_DEC = -28.936175
+_ROLL0 = 58.5986320306
+
+
+def _rotation_matrix(angle, axis):
+    # same convention as astropy.coordinates.matrix_utilities.rotation_matrix,
+    # i.e. a rotation of the frame (not of the vector) by angle (deg)
+    i = 'xyz'.index(axis)
+    a1, a2 = (i+1) % 3, (i+2) % 3
+    c, s = np.cos(np.deg2rad(angle)), np.sin(np.deg2rad(angle))
+    matrix = np.eye(3)
+    matrix[a1, a1] = c
+    matrix[a1, a2] = s
+    matrix[a2, a1] = -s
+    matrix[a2, a2] = c
+    return matrix
+
+
+def _galactic_to_galactocentric(solar_dist, z_sun):
+    # rotation matrix and offset of the affine transformation, as in
+    # astropy.coordinates.builtin_frames.galactocentric.get_matrix_vectors
+    equatorial_to_galactic = (_rotation_matrix(180 - _LON_NCP, 'z')
+                              @ _rotation_matrix(90 - _DEC_NGP, 'y')
+                              @ _rotation_matrix(_RA_NGP, 'z'))
+    equatorial_to_galcen_aligned = (_rotation_matrix(_ROLL0, 'x')
+                                    @ _rotation_matrix(-_GALCEN_DEC, 'y')
+                                    @ _rotation_matrix(_GALCEN_RA, 'z'))
+    tilt = _rotation_matrix(-np.rad2deg(np.arcsin(z_sun/solar_dist)), 'y')
+    matrix = tilt @ equatorial_to_galcen_aligned @ equatorial_to_galactic.T
+    offset = tilt @ np.array([solar_dist, 0., 0.])
+    return matrix, offset
+
+
+def heliocentric_to_galactocentric(glon, glat, dist_kpc, solar_dist=8.15,
+                                   z_sun=0.0055):
+    """
+    Convert coordinates from heliocentric (glon, glat, dist_kpc) to the
+    galactocentric cartesian frame of this model.
+
+    Parameters
+    ----------
+    glon, glat: array_like, array_like
+        Galactic longitude and latitude (decimal degrees)
+    dist_kpc: array_like
+        Heliocentric distance (kpc)
+    solar_dist: Number
+        Distance (kpc) of the Sun from the Galactic Centre
+    z_sun: Number
+        Height (kpc) of the Sun above the Galactic mid-plane
+
+    Returns
+    -------
+    numpy.ndarray x, y, z (kpc), broadcast from the inputs
+    """
+    glon, glat, dist_kpc = np.broadcast_arrays(
+        np.asarray(glon, dtype=float), np.asarray(glat, dtype=float),
+        np.asarray(dist_kpc, dtype=float))
+    l_rad = np.deg2rad(glon)
+    b_rad = np.deg2rad(glat)
+    heliocentric = np.stack((dist_kpc*np.cos(b_rad)*np.cos(l_rad),
+                             dist_kpc*np.cos(b_rad)*np.sin(l_rad),
+                             dist_kpc*np.sin(b_rad)))
+
+    matrix, offset = _galactic_to_galactocentric(solar_dist, z_sun)
+    x_gc, y_gc, z_gc = np.tensordot(matrix, heliocentric, axes=1) \
+        - offset.reshape((3,) + (1,)*glon.ndim)
+    # axis swap into the frame of this model
+    return y_gc, -x_gc, z_gc
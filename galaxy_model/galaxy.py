@@ -15,19 +15,38 @@ __maintainer__ = 'K-Monty'
 __email__ = 'kmgoh1995@gmail.com'
 
 
+from collections import OrderedDict
 from numbers import Number
-import matplotlib.pyplot as plt
-from matplotlib.patches import Ellipse
+import numpy as np
 from shapely.geometry import Point
 from shapely.ops import unary_union
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+from shapely.vectorized import contains
 from warnings import warn
 
+from .arm_coordinates import ArmCoordinateIndex
+from .coordinates import heliocentric_to_galactocentric
+from .instrumentation import timed
+from .level_of_detail import level_of_detail_report, simplify_polygon
+from .lookup_grid import LookupGrid
+from .membership import membership_probabilities
+from .parallel import classify_parallel
+from .shapes import Circle, Ellipse
+from .source_store import SourceStore
+from .sweep import sweep_parameters
+from .spiral_arms.spiral_property import CylinderSize, HEIGHT_SIGMA
 from .spiral_arms.sct_cen import SctCenArm
 from .spiral_arms.norma_outer import NormaOuterArm
 from .spiral_arms.perseus import PerseusArm
 from .spiral_arms.local import LocalArm
 from .spiral_arms.three_kpc import ThreeKpcArm
 from .spiral_arms.sgr_car import SgrCarArm
+from .spiral_arms.spiral_parameters import check_overrides
+
+# number of background rasters (see Galaxy.plot, cacheBackground) kept per
+# Galaxy; the least recently used one is dropped beyond that
+BACKGROUND_CACHE_SIZE = 4
 
 
 class Galaxy:
@@ -37,13 +56,29 @@ class Galaxy:
 
     Attributes
     ----------
-    self.gcbar: matplotlib.patches.Ellipse
+    self.bar: shapes.Ellipse
         a simplified ellipse representing Galactic Bar
+    self.gcbar: matplotlib.patches.Ellipse
+        patch of self.bar (a new patch is created on every access)
+    self.spiral_arms: list
+        spiral arm objects (see spiral_arms folder), built once when
+        the Galaxy is instantiated
+    self.param_overrides: dict or None
+        modified spiral parameters of the spiral arms, see __init__
+    self.instrumentation: Instrumentation or None
+        stage timings of the construction and location checks, see
+        __init__ and instrumentation.py
+    self.angular_step, self.max_boundary_error: Number, Number or None
+        level of detail of the spiral arm polygons, see __init__
     self.spurs: list
-        simplified circles representing a few spurious regions
-        (roughly) estimated mainly by using ALMAGAL data
+        simplified circles (shapes.Circle) representing a few spurious
+        regions (roughly) estimated mainly by using ALMAGAL data
+    self.lookup_grid: LookupGrid or None
+        precomputed raster grid for fast location checks,
+        see build_lookup_grid (method)
     self.src_x_coords, self.src_y_coords: list, list
-        user-inserted lists of x- and y- coordinates
+        user-inserted x- and y- coordinates (read-only; a new list is
+        returned on every access, see SourceStore for the arrays)
         see add_coords and remove_coords (methods)
 
     Methods
@@ -52,18 +87,89 @@ class Galaxy:
         add coordinates into self.src_x_coords, self.src_y_coords
     remove_coords(x_coord: list, y_coord: list)
         remove coordinates from self.src_x_coords, self.src_y_coords
-    plot(x_radius=16, y_radius=16, plotSrc=False)
+    plot(x_radius=16, y_radius=16, plotSrc=False, srcMode='scatter')
         plot the Galaxy with indicated x- and y- radius (kpc),
         starting from the Galactic Centre
         if plotSrc is True, the coordinates in the lists
-        self.src_x_coords, self.src_y_coords will also be plotted
+        self.src_x_coords, self.src_y_coords will also be plotted,
+        either as points (srcMode='scatter') or as a density image
+        (srcMode='density')
+        if isInteractive is True, the model and the sources are shown in an
+        interactive (zoom/pan) matplotlib window instead
     isOnSpiralArmOrSpur(x_coord: list, y_coord: list, verbose=False)
         check if the coordinates are on any spiral arm(s) or spur(s)
         if verbose is True, more details, e.g. on what spiral arms,
         will be printed out
+    isOnSpiralArmOrSpurBatch(x_coord: array_like, y_coord: array_like,
+                             use_lookup_grid=False)
+        vectorized version of isOnSpiralArmOrSpur, returning the location
+        encoding as numpy array
+    locationBitmask(x_coord: array_like, y_coord: array_like)
+        vectorized location check, returning one bit per spiral arm, spur
+        and the bar (see location_names and decodeLocationBitmask)
+    locationMatrix(x_coord: array_like, y_coord: array_like)
+        locationBitmask as boolean matrix (coordinates x arms, spurs, bar)
+    isOnBar(x_coord: array_like, y_coord: array_like)
+        check if the coordinates are on the Galactic bar
+    build_lookup_grid(cell_size=0.05, x_radius=16, y_radius=16)
+        precompute the raster grid used with use_lookup_grid=True
+    isOnSpiralArmOrSpurParallel(x_coord: array_like, y_coord: array_like,
+                                processes=None, chunk_size=1000000,
+                                use_lookup_grid=False)
+        isOnSpiralArmOrSpurBatch, run in chunks on a process pool
+    isOnSpiralArmOrSpur3D(x_coord: array_like, y_coord: array_like,
+                          z_coord: array_like, sigma=2)
+        isOnSpiralArmOrSpurBatch, also checking the height above the
+        Galactic mid-plane against the scale height of the arms
+    isOnSpiralArmOrSpurLBD(glon: array_like, glat: array_like,
+                           dist_kpc: array_like, check_height=False)
+        isOnSpiralArmOrSpurBatch (or isOnSpiralArmOrSpur3D) for
+        heliocentric Galactic coordinates
+    membershipProbabilities(glon: array_like, glat: array_like,
+                            dist_kpc: array_like, dist_err_kpc: array_like,
+                            num_samples=1000)
+        probabilities of being on each spiral arm and spur, under
+        distance uncertainties
+    armLocalCoordinates(x_coord: array_like, y_coord: array_like)
+        nearest spiral arm, offset from its spine and azimuth along it
+    sweepParameters(variants: list, x_coord: array_like,
+                    y_coord: array_like)
+        location encodings of the coordinates for each variant of the
+        spiral parameters
+    levelOfDetail(reference=None)
+        vertices and geometric error of the spiral arm polygons against
+        the polygons at full detail
     """
 
-    def __init__(self):
+    def __init__(self, geometry_cache_dir=None, param_overrides=None,
+                 instrumentation=None, angular_step=1,
+                 max_boundary_error=None):
+        """
+        Parameters
+        ----------
+        geometry_cache_dir: str (optional)
+            directory of the on-disk cache of the spiral arm geometry,
+            see spiral_arms/geometry_cache.py; not used if None (default)
+        param_overrides: dict (optional)
+            modified spiral parameters, as parameter dict name (see
+            spiral_arms/spiral_parameters.py) -> {parameter: value}, e.g.
+            {'Local': {'psi': -12}}; see spiral_parameters.with_overrides.
+            Unknown parameter dict names fail an assertion.
+        instrumentation: Instrumentation (optional)
+            records the wall time and number of calls of each stage of the
+            arm construction and of the location checks, per arm and spur,
+            see instrumentation.py; nothing is recorded if None (default)
+        angular_step: Number
+            azimuth step (deg) at which the spiral arms are sampled, see
+            SpiralArm; 1 (default) is the full detail, bigger steps build
+            coarser arms with fewer vertices
+        max_boundary_error: Number (optional)
+            if given, the spiral arm polygons are simplified (see
+            level_of_detail.py) as long as their boundary stays within
+            max_boundary_error (kpc) of the original one; used for the
+            location checks and the plots. See levelOfDetail for the
+            resulting error.
+        """
         # the keys doesn't matter; this dict is only created for
         # looping of the spiral arm objects within some private functions
         self.spiral_arm_obj = {"3-kpc": ThreeKpcArm,
@@ -72,91 +178,211 @@ class Galaxy:
                                "Sgr-Car": SgrCarArm,
                                "Perseus": PerseusArm,
                                "Local": LocalArm}
-        self.gcbar = Ellipse(xy=(0, 0), width=4.5*2, height=1.6*2, angle=60,
-                             color='grey', zorder=1)
-        self.spurs = [Point(-1.66, 4.85).buffer(1.15),
-                      Point(1.1, 4.4).buffer(0.8),
-                      Point(2.2, 3.75).buffer(0.5),
-                      Point(2.8, 3.1).buffer(0.5)]
-        self.src_x_coords = []
-        self.src_y_coords = []
+        self.spurs = [Circle(-1.66, 4.85, 1.15),
+                      Circle(1.1, 4.4, 0.8),
+                      Circle(2.2, 3.75, 0.5),
+                      Circle(2.8, 3.1, 0.5)]
+        self.bar = Ellipse(0, 0, 4.5, 1.6, angle=60)
+        self._sources = SourceStore()
+        self._background_cache = OrderedDict()
+        check_overrides(param_overrides)
+        # the spiral arms are built only once per Galaxy, and shared by
+        # the plotting and all the location checks
+        self.param_overrides = param_overrides
+        self.instrumentation = instrumentation
+        self.angular_step = angular_step
+        self.max_boundary_error = max_boundary_error
+        self._geometry_cache_dir = geometry_cache_dir
+        self.spiral_arms = [arm(cache_dir=geometry_cache_dir,
+                                param_overrides=param_overrides,
+                                instrumentation=instrumentation,
+                                angular_step=angular_step)
+                            for arm in self.spiral_arm_obj.values()]
+        self._spiral_arm_polygons = self._build_spiral_arm_polygons()
+        self._build_geometry_index()
+        self.lookup_grid = None
+        self._arm_coordinate_index = None
+
+    @staticmethod
+    def _spiral_arm_polygon(arm_obj):
+        # ThreeKpc arm has two (half-circle) parts
+        if repr(arm_obj) == "ThreeKpc":
+            return unary_union([arm_obj._polygon_near, arm_obj._polygon_far])
+        return arm_obj._polygon
+
+    def _arm_geometry(self, arm_obj):
+        # the polygon of the arm used for the location checks, at the level
+        # of detail of the Galaxy
+        polygon = self._spiral_arm_polygon(arm_obj)
+        if self.max_boundary_error is None:
+            return polygon
+        return simplify_polygon(polygon, self.max_boundary_error)
+
+    def _build_spiral_arm_polygons(self):
+        return {repr(arm_obj): self._arm_geometry(arm_obj)
+                for arm_obj in self.spiral_arms}
+
+    def levelOfDetail(self, reference=None):
+        """
+        Geometric error of the spiral arm polygons (at the angular_step and
+        max_boundary_error of this Galaxy) against the same arms at full
+        detail.
+
+        Parameters
+        ----------
+        reference: Galaxy (optional)
+            Galaxy whose arms (at its angular_step, without simplification)
+            are the reference; by default, the arms of this Galaxy at
+            angular_step=1 (which are built for the purpose unless this
+            Galaxy is at full detail)
+
+        Returns
+        -------
+        dict of arm name (e.g. 'Perseus') -> dict, see
+        level_of_detail.level_of_detail_report
+        """
+        if reference is not None:
+            reference_arms = reference.spiral_arms
+        elif self.angular_step == 1:
+            reference_arms = self.spiral_arms
+        else:
+            reference_arms = [
+                type(arm_obj)(cache_dir=self._geometry_cache_dir,
+                              param_overrides=self.param_overrides)
+                for arm_obj in self.spiral_arms]
+        # the arms of the reference unsimplified, whatever its
+        # max_boundary_error
+        reference_polygons = {
+            repr(arm_obj): self._spiral_arm_polygon(arm_obj)
+            for arm_obj in reference_arms}
+        return {name: level_of_detail_report(polygon,
+                                             reference_polygons[name])
+                for name, polygon in self._spiral_arm_polygons.items()}
+
+    def _build_geometry_index(self):
+        # spatial index over the bounding boxes of the spiral arm polygons
+        # only; the items are the positions of the arms in
+        # self._spiral_arm_polygons (the spurs and the bar are analytic
+        # shapes, which need no index)
+        geometries = list(self._spiral_arm_polygons.values())
+        self._geometry_index = STRtree(geometries, range(len(geometries)))
+        self._prepared_geometries = [prep(geom) for geom in geometries]
+
+    def __getstate__(self):
+        # the spatial index and prepared geometries can not be pickled;
+        # they are rebuilt from the (picklable) geometries instead. The
+        # instrumentation (and its callback) stays with the original, as do
+        # the sources and the plotting state (background rasters,
+        # interactive figure), which e.g. the workers of
+        # isOnSpiralArmOrSpurParallel don't need.
+        state = self.__dict__.copy()
+        del state['_geometry_index']
+        del state['_prepared_geometries']
+        del state['_sources']
+        del state['_background_cache']
+        state.pop('_interactive_view', None)
+        state['instrumentation'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._sources = SourceStore()
+        self._background_cache = OrderedDict()
+        self._build_geometry_index()
+
+    @property
+    def src_x_coords(self):
+        return self._sources.x.tolist()
+
+    @property
+    def src_y_coords(self):
+        return self._sources.y.tolist()
 
     def add_coord(self, x_coord: list, y_coord: list):
         """
         Parameters
         ----------
-        x_coord, y_coord: lists of numericals
+        x_coord, y_coord: lists (or array_like) of numericals
         """
         assert len(x_coord) == len(y_coord)
         assert len(x_coord) > 0
-        self.src_x_coords += x_coord
-        self.src_y_coords += y_coord
+        self._sources.add(x_coord, y_coord)
 
     def remove_coord(self, x_coord: list, y_coord: list):
         """
         Parameters
         ----------
-        x_coord, y_coord: lists of numericals
+        x_coord, y_coord: lists (or array_like) of numericals
 
         Note
         ----
         if two or more identical coordinates are found within the list,
-        only the first one found will be removed
+        only the first one found (i.e. the earliest added) will be removed;
+        coordinates not found, or found more than once, are reported in
+        one warning each
         """
         assert len(x_coord) == len(y_coord)
         assert len(x_coord) > 0
-        to_delete_indices = []
-        for x_todel, y_todel in zip(x_coord, y_coord):
-            x_match_indices = [i for i, x in enumerate(self.src_x_coords)
-                               if x == x_todel]
-            y_match_indices = [i for i, y in enumerate(self.src_y_coords)
-                               if y == y_todel]
-            to_delete_index = list(set(x_match_indices) & set(y_match_indices))
-            if len(to_delete_index) == 0:
-                warn("Nothing found for the coordinate ({}, {}).".format(
-                    x_todel, y_todel))
-                continue
-            # TODO: Instead of the first one found, maybe all?
-            if len(to_delete_index) > 1:
-                warn("More than 1 elements found for the coordinate ({}, {}). \
-                     The first element found will be removed.".format(
-                         x_todel, y_todel))
-            to_delete_index = to_delete_index[0]
-            to_delete_indices.append(to_delete_index)
-        self.src_x_coords = [x for i, x in enumerate(self.src_x_coords)
-                             if i not in to_delete_indices]
-        self.src_y_coords = [y for i, y in enumerate(self.src_y_coords)
-                             if i not in to_delete_indices]
+        missing, ambiguous = self._sources.remove(x_coord, y_coord)
+        if len(missing) > 0:
+            warn("Nothing found for {} coordinate(s), e.g. {}.".format(
+                len(missing), missing[:5]))
+        # TODO: Instead of the first one found, maybe all?
+        if len(ambiguous) > 0:
+            warn("More than 1 elements found for {} coordinate(s), e.g. {}. "
+                 "The first element found was removed.".format(
+                     len(ambiguous), ambiguous[:5]))
+
+    @property
+    def gcbar(self):
+        # matplotlib is only imported when plotting; a new patch is made for
+        # every figure, as a matplotlib artist can only live in one figure
+        return self.bar.patch(color='grey', zorder=1)
 
     def _draw_spiral_arms(self, ax):
-        for arm in list(self.spiral_arm_obj.values()):
-            arm_obj = arm()
+        self._draw_spiral_arm_spines(ax)
+        self._draw_spiral_arm_patches(ax, self.max_boundary_error or 0)
+
+    def _draw_spiral_arm_spines(self, ax):
+        for arm_obj in self.spiral_arms:
             # ThreeKpc arm has two (half-circle) parts
             if repr(arm_obj) == "ThreeKpc":
-                plt.plot(arm_obj.x_spine[0], arm_obj.y_spine[0],
-                         color=arm_obj._color, alpha=0.3, label=repr(arm_obj))
-                ax.add_patch(arm_obj.polypatch_near)
-                plt.plot(arm_obj.x_spine[1], arm_obj.y_spine[1],
-                         color=arm_obj._color, alpha=0.3)
-                ax.add_patch(arm_obj.polypatch_far)
+                ax.plot(arm_obj.x_spine[0], arm_obj.y_spine[0],
+                        color=arm_obj._color, alpha=0.3, label=repr(arm_obj))
+                ax.plot(arm_obj.x_spine[1], arm_obj.y_spine[1],
+                        color=arm_obj._color, alpha=0.3)
                 continue
 
-            plt.plot(arm_obj.x_spine, arm_obj.y_spine, color=arm_obj._color,
-                     alpha=0.3, label=repr(arm_obj))
-            ax.add_patch(arm_obj.polypatch)
+            ax.plot(arm_obj.x_spine, arm_obj.y_spine, color=arm_obj._color,
+                    alpha=0.3, label=repr(arm_obj))
+
+    def _draw_spiral_arm_patches(self, ax, simplify_tolerance=0):
+        # the arm objects are shared between plots, so a new patch is made
+        # for every figure; a matplotlib artist can only live in one figure
+        patches = []
+        for arm_obj in self.spiral_arms:
+            # ThreeKpc arm has two (half-circle) parts
+            if repr(arm_obj) == "ThreeKpc":
+                polygons = [arm_obj._polygon_near, arm_obj._polygon_far]
+            else:
+                polygons = [arm_obj._polygon]
+            for polygon in polygons:
+                polygon = simplify_polygon(polygon, simplify_tolerance)
+                patches.append(ax.add_patch(
+                    arm_obj._make_polypatch(polygon)))
+        return patches
 
     def _draw_spurs(self, ax):
         for spur in self.spurs:
-            x_spur, y_spur = spur.exterior.xy
-            ax.fill(x_spur, y_spur, alpha=0.3, color='mediumblue')
+            ax.add_patch(spur.patch(alpha=0.3, color='mediumblue'))
 
     def _draw_gc(self, ax):
         ax.add_patch(self.gcbar)
-        plt.scatter(0, 0, marker='x', color='black', zorder=100, s=200)
+        ax.scatter(0, 0, marker='x', color='black', zorder=100, s=200)
 
     def _label_galactic_quadrant(self, ax, x_radius=16, y_radius=16):
-        plt.axhline(8.15, color='grey', alpha=0.5, ls='--')
-        plt.axvline(0, color='grey', alpha=0.5, ls='--')
+        ax.axhline(8.15, color='grey', alpha=0.5, ls='--')
+        ax.axvline(0, color='grey', alpha=0.5, ls='--')
         ax.annotate("1st Quadrant", (x_radius*0.6, -y_radius+0.5), size=12)
         ax.annotate("4th Quadrant", (-x_radius+0.5, -y_radius+0.5), size=12)
         # an arbitrary number approximating the y-location of the sun
@@ -165,67 +391,175 @@ class Galaxy:
             ax.annotate("2nd Quadrant", (x_radius*0.6, y_radius-1), size=12)
             ax.annotate("3rd Quadrant", (-x_radius+0.5, y_radius-1), size=12)
 
-    def _plot_src(self):
-        assert len(self.src_x_coords) > 0
-        plt.scatter(self.src_x_coords, self.src_y_coords, color='steelblue',
-                    s=10, alpha=0.5, zorder=500)
+    def _plot_src(self, ax):
+        assert len(self._sources) > 0
+        ax.scatter(self._sources.x, self._sources.y, color='steelblue',
+                   s=10, alpha=0.5, zorder=500)
 
-    def _plot_basic(self, x_radius=16, y_radius=16):
-        fig, ax = plt.subplots(figsize=(8, 8))
+    def _plot_src_density(self, ax, x_radius=16, y_radius=16, bins=512,
+                          zorder=0, alpha=1):
+        # the cost of drawing depends on the number of bins, not on the
+        # number of sources; the image is drawn under the arm patches
+        from matplotlib.colors import LogNorm
+        assert len(self._sources) > 0
+        counts, _, _ = np.histogram2d(
+            self._sources.x, self._sources.y, bins=bins,
+            range=[[-x_radius, x_radius], [-y_radius, y_radius]])
+        # empty bins are left transparent
+        image = ax.imshow(np.ma.masked_equal(counts.T, 0), origin='lower',
+                          extent=(-x_radius, x_radius, -y_radius, y_radius),
+                          cmap='Blues', norm=LogNorm(),
+                          interpolation='nearest', zorder=zorder, alpha=alpha)
+        ax.figure.colorbar(image, ax=ax, label='sources per bin', shrink=0.7)
+
+    def _draw_static_model(self, ax, x_radius=16, y_radius=16):
         self._draw_spiral_arms(ax)
         self._draw_gc(ax)
         self._draw_spurs(ax)
         self._label_galactic_quadrant(ax, x_radius, y_radius)
-        plt.scatter(0, 8.15, marker='*', color='orange', s=200)
-        plt.legend(bbox_to_anchor=(0.25, 0.93), loc=1)
-        plt.xlim(-x_radius, x_radius)
-        plt.ylim(-y_radius, y_radius)
+        ax.scatter(0, 8.15, marker='*', color='orange', s=200)
+        ax.legend(bbox_to_anchor=(0.25, 0.93), loc=1)
+        ax.set_xlim(-x_radius, x_radius)
+        ax.set_ylim(-y_radius, y_radius)
+
+    def _plot_basic(self, x_radius=16, y_radius=16):
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots(figsize=(8, 8))
+        self._draw_static_model(ax, x_radius, y_radius)
+        return ax
+
+    def _static_background(self, ax, x_radius=16, y_radius=16):
+        # raster of everything drawn inside the axes by _draw_static_model,
+        # rendered once per extent and axes size (in pixels)
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        dpi = ax.figure.dpi
+        bbox = ax.get_window_extent()
+        key = (x_radius, y_radius, round(bbox.width), round(bbox.height),
+               dpi)
+        if key in self._background_cache:
+            self._background_cache.move_to_end(key)
+        else:
+            fig = Figure(figsize=(key[2]/dpi, key[3]/dpi), dpi=dpi)
+            canvas = FigureCanvasAgg(fig)
+            background_ax = fig.add_axes([0, 0, 1, 1])
+            self._draw_static_model(background_ax, x_radius, y_radius)
+            background_ax.set_axis_off()
+            canvas.draw()
+            self._background_cache[key] = np.asarray(
+                canvas.buffer_rgba()).copy()
+            if len(self._background_cache) > BACKGROUND_CACHE_SIZE:
+                self._background_cache.popitem(last=False)
+        return self._background_cache[key]
+
+    def _plot_cached(self, x_radius=16, y_radius=16):
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots(figsize=(8, 8))
+        ax.imshow(self._static_background(ax, x_radius, y_radius),
+                  extent=(-x_radius, x_radius, -y_radius, y_radius),
+                  aspect='auto', interpolation='none', zorder=0)
+        ax.set_xlim(-x_radius, x_radius)
+        ax.set_ylim(-y_radius, y_radius)
+        return ax
 
-    # TODO: use Pandas-Bokeh?
-    def _plot_interactive(self, annotate=True):
-        raise NotImplementedError
+    def _plot_interactive(self, x_radius=16, y_radius=16, maxPoints=50000,
+                          plotSrc=True):
+        import matplotlib.pyplot as plt
+        from .interactive import InteractiveView
+        fig, ax = plt.subplots(figsize=(8, 8))
+        # the view has to be kept alive, as matplotlib only keeps weak
+        # references to the callbacks
+        self._interactive_view = InteractiveView(
+            self, ax, x_radius, y_radius, maxPoints, show_sources=plotSrc)
+        return self._interactive_view
 
-    # Interactive mode is not yet implemented!!!
     def plot(self, x_radius=16, y_radius=16, plotSrc=False,
-             isInteractive=False):
+             isInteractive=False, srcMode='scatter', densityBins=512,
+             cacheBackground=False, maxPoints=50000):
         """
         Parameters
         ----------
         x_radius, y_radius: Number, Number
             x- and y-radius of the Galaxy (kpc), starting from
             the Galactic Centre (0, 0)
+        srcMode: str
+            'scatter' plots every source as a point; 'density' bins the
+            sources into a 2D histogram image (meant for large catalogues)
+        densityBins: int
+            number of bins per axis in 'density' mode
+        cacheBackground: bool
+            Render the static model (arms, spurs, bar, labels, legend) only
+            once per extent and figure size, and reuse it as a raster image
+            for the following plots; only the sources are drawn anew.
+            The raster has the resolution of the figure dpi, i.e. it does not
+            scale up when saving at a higher dpi. The rasters of the
+            BACKGROUND_CACHE_SIZE most recently used extents and sizes are
+            kept.
+        isInteractive: bool
+            Browse the model (with the sources if plotSrc is True) in an
+            interactive matplotlib window (any local backend, e.g. TkAgg or
+            QtAgg; show it with matplotlib.pyplot.show()). The sources are
+            decimated to at most maxPoints within the current view, and the
+            arm outlines are simplified when zoomed out (see
+            interactive.py).
+        maxPoints: int
+            maximum number of sources drawn at once in interactive mode
         """
+        assert srcMode in ('scatter', 'density')
         if isInteractive is False:
-            self._plot_basic(x_radius, y_radius)
-            if plotSrc is True:
-                self._plot_src()
+            if cacheBackground:
+                ax = self._plot_cached(x_radius, y_radius)
+            else:
+                ax = self._plot_basic(x_radius, y_radius)
+            if plotSrc is True and srcMode == 'density':
+                # the arm patches are part of the cached raster, so the
+                # density image has to go on top of them
+                zorder, alpha = (1, 0.7) if cacheBackground else (0, 1)
+                self._plot_src_density(ax, x_radius, y_radius, densityBins,
+                                       zorder, alpha)
+            elif plotSrc is True:
+                self._plot_src(ax)
         else:
-            try:
-                self._plot_interactive()
-            except NotImplementedError:
-                print("Interactive mode is not yet implemented")
+            self._plot_interactive(x_radius, y_radius, maxPoints,
+                                   plotSrc is True)
+
+    def _candidate_geometries(self, point):
+        # only the spiral arms whose bounding box contains the point
+        return sorted(self._geometry_index.query_items(point))
+
+    def _contains_point(self, i, point):
+        if self.instrumentation is None:
+            return self._prepared_geometries[i].contains(point)
+        with self.instrumentation.timed('contains',
+                                        self._geometry_names()[i]):
+            return self._prepared_geometries[i].contains(point)
 
     def _on_spur(self, x: Number, y: Number):
-        return any([s.contains(Point(x, y)) for s in self.spurs])
+        if self.instrumentation is None:
+            return any([spur.contains(x, y) for spur in self.spurs])
+        names = self._geometry_names()[len(self._spiral_arm_polygons):]
+        on_spur = False
+        for spur, name in zip(self.spurs, names):
+            with self.instrumentation.timed('contains', name):
+                on_spur |= bool(spur.contains(x, y))
+        return on_spur
+
+    def _on_gc_bar(self, x: Number, y: Number):
+        return bool(self.bar.contains(x, y))
 
     def _on_spiral_arm(self, x: Number, y: Number):
         spiral_arms = []
-        for arm in list(self.spiral_arm_obj.values()):
-            if repr(arm()) == "ThreeKpc":
-                poly_list = [arm()._polygon_near, arm()._polygon_far]
-                poly = unary_union(poly_list)
-            else:
-                poly = arm()._polygon
-            on_spiral_arm = poly.contains(Point(x, y))
-            if on_spiral_arm:
-                spiral_arms.append(repr(arm()))
+        point = Point(x, y)
+        arm_names = list(self._spiral_arm_polygons)
+        for i in self._candidate_geometries(point):
+            if self._contains_point(i, point):
+                spiral_arms.append(arm_names[i])
         if len(spiral_arms) > 0:
             on_spiral_arm = True
         else:
             on_spiral_arm = False
         return on_spiral_arm, spiral_arms
 
-    # TODO: add _on_gc_bar???
     def isOnSpiralArmOrSpur(self, x_coord: list, y_coord: list, verbose=False):
         """
         Check if the coordinates in the given list are located on a
@@ -255,7 +589,9 @@ class Galaxy:
         ----
         In verbose mode, spiral arm information has higher priority than spur.
         If a coordinate is on both spiral arm and spur, only the spiral
-        arm information will be printed.
+        arm information will be printed. Coordinates on neither are checked
+        against the Galactic bar (which is not part of the encoding, see
+        isOnBar).
         """
 
         def verbose_statements(x, y, on_spiral_arm, on_spur, spiral_arms):
@@ -265,6 +601,8 @@ class Galaxy:
                        (x, y), spiral_arms))
             elif on_spur:
                 print("{} is on a spur".format((x, y)))
+            elif self._on_gc_bar(x, y):
+                print("{} is on the Galactic bar".format((x, y)))
             else:
                 print("{} is on nothing".format((x, y)))
 
@@ -293,3 +631,414 @@ class Galaxy:
                                                   spiral_arms))
 
         return on_anything
+
+    def _geometries(self):
+        # the n-th geometry is stored in the n-th bit of a location bitmask;
+        # spiral arms first, followed by spurs and the bar
+        return list(self._spiral_arm_polygons.values()) + list(self.spurs) \
+            + [self.bar]
+
+    def _geometry_names(self):
+        # names of the geometries in self._geometries()
+        return list(self._spiral_arm_polygons) \
+            + ['Spur{}'.format(i) for i in range(len(self.spurs))] + ['Bar']
+
+    @staticmethod
+    def _contains(geom, x, y):
+        if isinstance(geom, Ellipse):
+            # spurs and bar: exact, and cheaper than any pre-selection
+            return geom.contains(x, y)
+        # bounding box pre-selection; most of the plane is outside
+        # of any given arm
+        x_min, y_min, x_max, y_max = geom.bounds
+        candidates = np.flatnonzero((x >= x_min) & (x <= x_max)
+                                    & (y >= y_min) & (y <= y_max))
+        inside = np.zeros(x.shape, dtype=bool)
+        inside.flat[candidates] = contains(geom, x.flat[candidates],
+                                           y.flat[candidates])
+        return inside
+
+    def _location_bitmask(self, x, y):
+        bitmask = np.zeros(x.shape, dtype=np.uint16)
+        for bit, (geom, name) in enumerate(zip(self._geometries(),
+                                               self._geometry_names())):
+            with timed(self.instrumentation, 'contains_batch', name):
+                bitmask[self._contains(geom, x, y)] |= np.uint16(1 << bit)
+        return bitmask
+
+    def _bitmask_to_location_encoding(self, bitmask):
+        # the bar is not part of this encoding
+        num_arm_bits = len(self._spiral_arm_polygons)
+        num_arms = np.zeros(bitmask.shape, dtype=np.int64)
+        for bit in range(num_arm_bits):
+            num_arms += (bitmask >> bit) & 1
+        spur_bits = ((1 << len(self.spurs)) - 1) << num_arm_bits
+        on_spur = (bitmask & spur_bits) != 0
+
+        on_anything = np.zeros(bitmask.shape, dtype=np.int64)
+        on_anything[num_arms > 0] = 1
+        on_anything[on_spur] = 2
+        on_anything[(on_spur & (num_arms > 0)) | (num_arms > 1)] = 3
+        return on_anything
+
+    def build_lookup_grid(self, cell_size=0.05, x_radius=16, y_radius=16):
+        """
+        Precompute the raster lookup grid used by
+        isOnSpiralArmOrSpurBatch(..., use_lookup_grid=True).
+
+        Parameters
+        ----------
+        cell_size: Number
+            size (kpc) of a grid cell; memory use scales with
+            (2*x_radius/cell_size) * (2*y_radius/cell_size)
+        x_radius, y_radius: Number, Number
+            x- and y-radius (kpc) covered by the grid, starting from
+            the Galactic Centre (0, 0)
+        """
+        self.lookup_grid = LookupGrid(self._geometries(), x_radius, y_radius,
+                                      cell_size)
+        return self.lookup_grid
+
+    def _batch_bitmask(self, x, y, use_lookup_grid=False):
+        if not use_lookup_grid:
+            return self._location_bitmask(x, y)
+        if self.lookup_grid is None:
+            self.build_lookup_grid()
+        bitmask, is_exact = self.lookup_grid.lookup(x, y)
+        bitmask[~is_exact] = self._location_bitmask(x[~is_exact],
+                                                    y[~is_exact])
+        return bitmask
+
+    def isOnBar(self, x_coord, y_coord):
+        """
+        Vectorized check whether the coordinates are on the Galactic bar
+        (self.bar), which is not part of the location encoding of
+        isOnSpiralArmOrSpur (see locationBitmask for both at once).
+
+        Parameters
+        ----------
+        x_coord, y_coord: array_like of numericals (same shape)
+
+        Returns
+        -------
+        numpy.ndarray of bool, with the same shape as x_coord
+        """
+        x = np.asarray(x_coord, dtype=float)
+        y = np.asarray(y_coord, dtype=float)
+        assert x.shape == y.shape
+        return self.bar.contains(x, y)
+
+    @property
+    def location_names(self):
+        """
+        Names of the spiral arms (e.g. 'Perseus'), spurs ('Spur0',
+        'Spur1', ..., in the order of self.spurs) and the Galactic bar
+        ('Bar'); name n is the n-th bit of locationBitmask and the n-th
+        column of locationMatrix.
+        """
+        return self._geometry_names()
+
+    def locationBitmask(self, x_coord, y_coord, z_coord=None,
+                        sigma=HEIGHT_SIGMA, use_lookup_grid=False):
+        """
+        Locations of the coordinates as bitmasks: bit n is set if the
+        coordinate is within self.location_names[n]. Unlike the location
+        encoding of isOnSpiralArmOrSpur, no detail is lost, e.g. which arms
+        a coordinate in more than one arm is in, and the Galactic bar is
+        included.
+
+        Parameters
+        ----------
+        x_coord, y_coord: array_like of numericals (same shape)
+        z_coord: array_like (optional)
+            height (kpc) above the Galactic mid-plane; if given, coordinates
+            are only located in the spiral arms and spurs within their
+            height, see isOnSpiralArmOrSpur3D. The bar is located at any
+            height.
+        sigma: Number
+            see isOnSpiralArmOrSpur3D
+        use_lookup_grid: bool
+            see isOnSpiralArmOrSpurBatch
+
+        Returns
+        -------
+        numpy.ndarray of uint16, with the same shape as x_coord; see
+        decodeLocationBitmask
+        """
+        x = np.asarray(x_coord, dtype=float)
+        y = np.asarray(y_coord, dtype=float)
+        assert x.shape == y.shape
+        if z_coord is None:
+            return self._batch_bitmask(x, y, use_lookup_grid)
+        z = np.asarray(z_coord, dtype=float)
+        assert z.shape == x.shape
+        # the tests of the arms and spurs are only needed within their
+        # height; beyond it, only the bar is tested
+        within_height = self._within_height(x, y, z, sigma)
+        bitmask = np.zeros(x.shape, dtype=np.uint16)
+        bitmask[within_height] = self._batch_bitmask(
+            x[within_height], y[within_height], use_lookup_grid)
+        beyond_height = ~within_height
+        bitmask[beyond_height] = np.where(
+            self._contains(self.bar, x[beyond_height], y[beyond_height]),
+            self._bar_bit, np.uint16(0))
+        return bitmask
+
+    def decodeLocationBitmask(self, bitmask):
+        """
+        Parameters
+        ----------
+        bitmask: int
+            a single value of locationBitmask
+
+        Returns
+        -------
+        list of the names (see location_names) of the spiral arms, spurs
+        and bar in the bitmask, e.g. ['SctCen', 'Spur1']
+        """
+        return [name for bit, name in enumerate(self._geometry_names())
+                if (int(bitmask) >> bit) & 1]
+
+    def locationMatrix(self, x_coord, y_coord, z_coord=None,
+                       sigma=HEIGHT_SIGMA, use_lookup_grid=False):
+        """
+        locationBitmask, unpacked into a membership matrix.
+
+        Returns
+        -------
+        numpy.ndarray of bool, of shape x_coord.shape
+        + (len(self.location_names),): [..., n] is True if the coordinate is
+        within self.location_names[n]
+        """
+        bitmask = self.locationBitmask(x_coord, y_coord, z_coord, sigma,
+                                       use_lookup_grid)
+        bits = np.arange(len(self._geometry_names()), dtype=np.uint16)
+        return ((bitmask[..., np.newaxis] >> bits) & 1).astype(bool)
+
+    def isOnSpiralArmOrSpurBatch(self, x_coord, y_coord,
+                                 use_lookup_grid=False):
+        """
+        Vectorized version of isOnSpiralArmOrSpur, meant for large catalogues.
+        The point-in-polygon tests are done on the whole arrays at once.
+
+        Parameters
+        ----------
+        x_coord, y_coord: array_like of numericals (same shape)
+        use_lookup_grid: bool
+            Look the locations up in the precomputed raster grid (see
+            build_lookup_grid; built with default settings if not yet done).
+            Only coordinates in cells crossed by a boundary, or outside
+            of the grid, go through the exact test. Results are identical.
+
+        Returns
+        -------
+        numpy.ndarray of int, with the same shape as x_coord, encoding the
+        locations of coordinates the same way as isOnSpiralArmOrSpur
+        """
+        x = np.asarray(x_coord, dtype=float)
+        y = np.asarray(y_coord, dtype=float)
+        assert x.shape == y.shape
+        return self._bitmask_to_location_encoding(
+            self._batch_bitmask(x, y, use_lookup_grid))
+
+    @staticmethod
+    def _within_height(x, y, z, sigma=HEIGHT_SIGMA):
+        # the thickness of the arms and spurs only depends on the
+        # galactocentric radius, see spiral_property.CylinderSize; the bar
+        # (a thick structure) has no height cut
+        return np.abs(z) <= sigma*CylinderSize.height_kpc(np.hypot(x, y))
+
+    @property
+    def _bar_bit(self):
+        # bit of the bar in a location bitmask, see _geometries
+        return np.uint16(1 << (len(self._geometries()) - 1))
+
+    def isOnSpiralArmOrSpur3D(self, x_coord, y_coord, z_coord,
+                              sigma=HEIGHT_SIGMA, use_lookup_grid=False):
+        """
+        3D version of isOnSpiralArmOrSpurBatch: coordinates are only on a
+        spiral arm or spur if they are also within sigma scale heights
+        (spiral_property.CylinderSize.height_kpc, at their galactocentric
+        radius) of the Galactic mid-plane. Locations in the bar (see
+        locationBitmask) have no height cut.
+
+        Parameters
+        ----------
+        x_coord, y_coord, z_coord: array_like of numericals (same shape)
+            z_coord is the height (kpc) above the Galactic mid-plane
+        sigma: Number
+            number of scale heights above or below the mid-plane counted as
+            within the arms and spurs; defaults to
+            spiral_property.HEIGHT_SIGMA (2)
+        use_lookup_grid: bool
+            see isOnSpiralArmOrSpurBatch
+
+        Returns
+        -------
+        numpy.ndarray of int, with the same shape as x_coord, encoding the
+        locations of coordinates the same way as isOnSpiralArmOrSpur
+        """
+        return self._bitmask_to_location_encoding(self.locationBitmask(
+            x_coord, y_coord, z_coord, sigma, use_lookup_grid))
+
+    def isOnSpiralArmOrSpurLBD(self, glon, glat, dist_kpc, solar_dist=8.15,
+                               z_sun=0.0055, use_lookup_grid=False,
+                               check_height=False):
+        """
+        isOnSpiralArmOrSpurBatch for heliocentric Galactic coordinates, which
+        are converted into the frame of this model with
+        coordinates.heliocentric_to_galactocentric (NumPy only).
+
+        Parameters
+        ----------
+        glon, glat: array_like, array_like
+            Galactic longitude and latitude (decimal degrees)
+        dist_kpc: array_like
+            Heliocentric distance (kpc)
+        solar_dist: Number
+            Distance (kpc) of the Sun from the Galactic Centre
+        z_sun: Number
+            Height (kpc) of the Sun above the Galactic mid-plane
+        use_lookup_grid: bool
+            see isOnSpiralArmOrSpurBatch
+        check_height: bool
+            also check the height above the Galactic mid-plane, see
+            isOnSpiralArmOrSpur3D
+
+        Returns
+        -------
+        numpy.ndarray of int, encoding the locations of coordinates the same
+        way as isOnSpiralArmOrSpur
+        """
+        x, y, z = heliocentric_to_galactocentric(glon, glat, dist_kpc,
+                                                 solar_dist, z_sun)
+        if check_height:
+            return self.isOnSpiralArmOrSpur3D(x, y, z,
+                                              use_lookup_grid=use_lookup_grid)
+        return self.isOnSpiralArmOrSpurBatch(x, y,
+                                             use_lookup_grid=use_lookup_grid)
+
+    def membershipProbabilities(self, glon, glat, dist_kpc, dist_err_kpc,
+                                num_samples=1000, chunk_size=1000000,
+                                seed=None, solar_dist=8.15, z_sun=0.0055,
+                                use_lookup_grid=False, check_height=False):
+        """
+        Monte Carlo membership probabilities of sources with uncertain
+        distances: num_samples distances are drawn along the line of sight
+        of each source, and located in one vectorized pass, chunk_size
+        samples at a time (see membership.py).
+
+        Parameters
+        ----------
+        glon, glat: array_like, array_like
+            Galactic longitude and latitude (decimal degrees)
+        dist_kpc, dist_err_kpc: array_like, array_like
+            Heliocentric distance (kpc) and its uncertainty (standard
+            deviation of a normal distribution, truncated at zero distance)
+        num_samples: int
+            number of distance samples per source
+        chunk_size: int
+            (maximum) number of samples located at once; bounds the memory
+            use (roughly 50 bytes per sample)
+        seed: int (optional)
+            seed of the random distance samples
+        solar_dist, z_sun, use_lookup_grid:
+            see isOnSpiralArmOrSpurLBD; use_lookup_grid=True is recommended
+            for large numbers of samples
+        check_height: bool
+            only count the samples within the height of the arms, see
+            isOnSpiralArmOrSpur3D
+
+        Returns
+        -------
+        dict of numpy.ndarray of float, each of the same length as glon:
+        the probability of each source to be on each spiral arm, spur and
+        the bar, keyed by self.location_names
+        """
+        return membership_probabilities(
+            self, glon, glat, dist_kpc, dist_err_kpc, num_samples, chunk_size,
+            seed, solar_dist, z_sun, use_lookup_grid, check_height)
+
+    def isOnSpiralArmOrSpurParallel(self, x_coord, y_coord, processes=None,
+                                    chunk_size=1000000,
+                                    use_lookup_grid=False):
+        """
+        Parallel version of isOnSpiralArmOrSpurBatch, for catalogues of tens
+        of millions of coordinates. The coordinates are split into chunks of
+        chunk_size, and classified on a pool of worker processes, which share
+        the geometry of this Galaxy (see parallel.py).
+
+        Parameters
+        ----------
+        x_coord, y_coord: array_like of numericals (same shape)
+        processes: int (optional)
+            number of worker processes; defaults to the number of cores
+        chunk_size: int
+            number of coordinates classified per task
+        use_lookup_grid: bool
+            see isOnSpiralArmOrSpurBatch
+
+        Returns
+        -------
+        numpy.ndarray of int, in the same order (and shape) as the input,
+        encoding the locations the same way as isOnSpiralArmOrSpur
+        """
+        return classify_parallel(self, x_coord, y_coord, processes,
+                                 chunk_size, use_lookup_grid)
+
+    def armLocalCoordinates(self, x_coord, y_coord):
+        """
+        Arm-local coordinates of the given coordinates, relative to the
+        nearest spiral arm (spine).
+
+        Parameters
+        ----------
+        x_coord, y_coord: array_like of numericals (same shape)
+
+        Returns
+        -------
+        dict of numpy.ndarray, each with the same shape as x_coord:
+
+        'arm': name of the nearest spiral arm (repr of the arm object)
+
+        'offset_kpc': perpendicular distance (kpc) from the spine of that arm;
+            negative on the inner side (towards the Galactic Centre),
+            positive on the outer side
+
+        'offset_width': offset_kpc in units of the local (half-)width of the
+            arm, i.e. within (-1, 1) for coordinates within the arm outline
+
+        'B': azimuth (deg) of the closest point on the spine
+        """
+        if self._arm_coordinate_index is None:
+            self._arm_coordinate_index = ArmCoordinateIndex(self.spiral_arms)
+        return self._arm_coordinate_index.query(x_coord, y_coord)
+
+    def sweepParameters(self, variants, x_coord, y_coord,
+                        geometry_cache_dir=None):
+        """
+        Classify the same coordinates for a number of variants of the spiral
+        parameters, e.g. for sensitivity studies. Only the arms whose
+        parameters differ are rebuilt (once per distinct set of parameters),
+        and unchanged arms are neither rebuilt nor tested again, see
+        sweep.py.
+
+        Parameters
+        ----------
+        variants: sequence of dict
+            param_overrides of each variant (see __init__), relative to the
+            default parameters, e.g.
+            [{'Local': {'psi': psi}} for psi in (-10, -11, -12)]
+        x_coord, y_coord: array_like of numericals (same shape)
+        geometry_cache_dir: str (optional)
+            on-disk cache of the arm geometry (see __init__) for the arms
+            built for the variants
+
+        Returns
+        -------
+        numpy.ndarray of int8, of shape (len(variants), number of
+        coordinates): row i is the location encoding (see
+        isOnSpiralArmOrSpur) of the coordinates for variants[i]
+        """
+        return sweep_parameters(self, variants, x_coord, y_coord,
+                                geometry_cache_dir)
@@ -0,0 +1,95 @@
+"""
+This module contains the (opt-in) instrumentation of Galaxy and SpiralArm:
+wall time and number of calls of each stage of the arm construction and of
+the location checks, per arm (or spur).
+
+Stages:
+
+- 'spine': spine radii and widths along the azimuth range, and the spine
+  coordinates (including the 'smoothing')
+- 'smoothing': savgol smoothing of the spine radii and widths
+- 'borders': normals and borders of the spine, i.e. the polygon vertices
+- 'polygon': shapely Polygon construction
+- 'cache_load': loading the geometry from the on-disk cache
+- 'patch': matplotlib (descartes) patch construction
+- 'contains': per-coordinate containment test (Galaxy.isOnSpiralArmOrSpur)
+- 'contains_batch': vectorized containment test
+  (Galaxy.isOnSpiralArmOrSpurBatch and the methods built on it)
+
+Nothing is recorded, and nothing is timed, unless an Instrumentation is
+given to Galaxy (or a SpiralArm).
+"""
+
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class Instrumentation:
+    """
+    Parameters
+    ----------
+    callback: callable (optional)
+        called as callback(stage, name, elapsed_s) after every timed stage,
+        where name is the arm (repr of the arm object) or spur ('Spur0',
+        'Spur1', ...) name
+
+    Methods
+    -------
+    timed(stage: str, name: str)
+        context manager timing the stage for the arm/spur name
+    report()
+        recorded calls and wall times per stage and arm/spur
+    reset()
+        forget all recorded calls
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        # (stage, name) -> [calls, total wall time (s)]
+        self._records = {}
+
+    @contextmanager
+    def timed(self, stage, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, name, perf_counter() - start)
+
+    def record(self, stage, name, elapsed_s):
+        record = self._records.setdefault((stage, name), [0, 0.])
+        record[0] += 1
+        record[1] += elapsed_s
+        if self.callback is not None:
+            self.callback(stage, name, elapsed_s)
+
+    def report(self):
+        """
+        Returns
+        -------
+        list of dict with keys 'stage', 'name', 'calls' and 'total_s'
+        (wall time in seconds), one per stage and arm/spur, in descending
+        order of total_s
+        """
+        rows = [{'stage': stage, 'name': name, 'calls': calls,
+                 'total_s': total_s}
+                for (stage, name), (calls, total_s) in self._records.items()]
+        return sorted(rows, key=lambda row: row['total_s'], reverse=True)
+
+    def reset(self):
+        self._records = {}
+
+
+@contextmanager
+def _not_timed():
+    yield
+
+
+def timed(instrumentation, stage, name):
+    """
+    instrumentation.timed(stage, name), or a no-op context manager if
+    instrumentation is None
+    """
+    if instrumentation is None:
+        return _not_timed()
+    return instrumentation.timed(stage, name)
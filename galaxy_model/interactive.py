@@ -0,0 +1,136 @@
+"""
+This module contains the interactive (zoom/pan) view used by
+Galaxy.plot(isInteractive=True).
+
+It works with any local matplotlib backend (e.g. TkAgg, QtAgg), i.e. without
+network access. To stay responsive with millions of sources, the view redraws
+a level of detail that depends on the current zoom:
+
+- the sources are decimated to a uniform random subsample of at most
+  max_points among the sources within the view;
+- the arm outlines are simplified, with a tolerance below the size of
+  a pixel of the current view.
+"""
+
+import numpy as np
+from matplotlib.artist import Artist
+
+# tolerances (kpc) of the simplified arm outlines; 0 is the full outline
+LOD_TOLERANCES = (0, 0.01, 0.03, 0.1)
+
+
+class _Refresher(Artist):
+    # invisible artist drawn first in its axes, calling refresh before the
+    # sources and arm outlines are drawn
+    def __init__(self, refresh):
+        super().__init__()
+        self._refresh = refresh
+        self.set_zorder(-np.inf)
+        self.set_in_layout(False)
+
+    def draw(self, renderer):
+        self._refresh()
+
+
+class InteractiveView:
+    """
+    Parameters
+    ----------
+    galaxy: Galaxy
+    ax: matplotlib.axes.Axes
+        (empty) axes to draw on
+    x_radius, y_radius: Number, Number
+        initial x- and y-radius (kpc) of the view, starting from the
+        Galactic Centre (0, 0)
+    max_points: int
+        maximum number of sources drawn at once
+    seed: int
+        seed of the random order used for the decimation
+    show_sources: bool
+        whether the sources are drawn at all
+
+    Attributes
+    ----------
+    self.num_in_view, self.num_shown: int, int
+        number of sources within the current view, and the number of them
+        actually drawn
+    self.tolerance: Number
+        tolerance (kpc) of the arm outlines currently drawn
+    """
+
+    def __init__(self, galaxy, ax, x_radius=16, y_radius=16,
+                 max_points=50000, seed=0, show_sources=True):
+        assert max_points > 0
+        self.ax = ax
+        self.max_points = max_points
+        galaxy._draw_spiral_arm_spines(ax)
+        self._arm_patches = {
+            tolerance: galaxy._draw_spiral_arm_patches(ax, tolerance)
+            for tolerance in LOD_TOLERANCES}
+        galaxy._draw_gc(ax)
+        galaxy._draw_spurs(ax)
+        galaxy._label_galactic_quadrant(ax, x_radius, y_radius)
+        ax.scatter(0, 8.15, marker='*', color='orange', s=200)
+        ax.legend(bbox_to_anchor=(0.25, 0.93), loc=1)
+
+        # the sources are shuffled once, so that the first max_points
+        # sources within any view are a uniform random subsample
+        num_sources = len(galaxy._sources) if show_sources else 0
+        order = np.random.default_rng(seed).permutation(num_sources)
+        self._x = galaxy._sources.x[:num_sources][order]
+        self._y = galaxy._sources.y[:num_sources][order]
+        self._sources = ax.scatter(np.empty(0), np.empty(0),
+                                   color='steelblue', s=10, alpha=0.5,
+                                   zorder=500)
+
+        ax.set_xlim(-x_radius, x_radius)
+        ax.set_ylim(-y_radius, y_radius)
+        # a zoom or pan changes the x and the y limits one after the other;
+        # the limit callbacks only mark the view as stale, and it is
+        # refreshed once, when the axes are drawn next
+        self._stale = False
+        ax.add_artist(_Refresher(self._refresh_if_stale))
+        ax.callbacks.connect('xlim_changed', self._on_view_changed)
+        ax.callbacks.connect('ylim_changed', self._on_view_changed)
+        self.update()
+
+    def _on_view_changed(self, ax):
+        # matplotlib redraws the (stale) figure itself after a zoom or pan
+        self._stale = True
+
+    def _refresh_if_stale(self):
+        if self._stale:
+            self._refresh()
+
+    def update(self):
+        """
+        Redraw the sources and arm outlines for the current view.
+        """
+        self._refresh()
+        self.ax.figure.canvas.draw_idle()
+
+    def _refresh(self):
+        self._stale = False
+        x_min, x_max = sorted(self.ax.get_xlim())
+        y_min, y_max = sorted(self.ax.get_ylim())
+
+        in_view = np.flatnonzero((self._x >= x_min) & (self._x <= x_max)
+                                 & (self._y >= y_min) & (self._y <= y_max))
+        shown = in_view[:self.max_points]
+        self._sources.set_offsets(np.column_stack((self._x[shown],
+                                                   self._y[shown])))
+        self.num_in_view = len(in_view)
+        self.num_shown = len(shown)
+        if self.num_shown < self.num_in_view:
+            self.ax.set_title("{} of {} sources in view shown".format(
+                self.num_shown, self.num_in_view))
+        else:
+            self.ax.set_title("")
+
+        pixel_size = (x_max - x_min) / max(
+            self.ax.get_window_extent().width, 1)
+        self.tolerance = max(tolerance for tolerance in LOD_TOLERANCES
+                             if tolerance <= pixel_size)
+        for tolerance, patches in self._arm_patches.items():
+            for patch in patches:
+                patch.set_visible(tolerance == self.tolerance)
@@ -0,0 +1,109 @@
+"""
+This module contains the levels of detail of the spiral arm polygons used by
+Galaxy(angular_step=..., max_boundary_error=...): simplified polygons with
+fewer vertices, and their geometric error against a reference polygon.
+
+Fewer vertices make the location checks, the lookup grid and the plots
+cheaper; the error tells how far the boundary of a simplified polygon can
+be off, i.e. which coordinates close to a boundary would need the reference
+polygon to be classified reliably.
+"""
+
+import numpy as np
+
+# spacing (kpc) of the points along the boundaries at which the boundary
+# error is measured; the measured error is accurate to half of it
+ERROR_SPACING = 0.005
+
+
+def simplify_polygon(polygon, max_error):
+    """
+    Parameters
+    ----------
+    polygon: shapely Polygon or MultiPolygon
+    max_error: Number
+        maximum distance (kpc) of the simplified boundary from the original
+
+    Returns
+    -------
+    shapely Polygon or MultiPolygon with a subset of the vertices of
+    polygon (Douglas-Peucker), or polygon itself if max_error is 0
+    """
+    assert max_error >= 0
+    if max_error == 0:
+        return polygon
+    return polygon.simplify(max_error, preserve_topology=True)
+
+
+def _rings(polygon):
+    return [polygon.exterior] + list(polygon.interiors)
+
+
+def _boundary_rings(geom):
+    if geom.geom_type == 'MultiPolygon':
+        return [ring for polygon in geom.geoms for ring in _rings(polygon)]
+    return _rings(geom)
+
+
+def _densify(coords, spacing):
+    # points along the (closed) ring with at most spacing between them
+    coords = np.asarray(coords)
+    segments = np.diff(coords, axis=0)
+    num_steps = np.maximum(np.ceil(
+        np.hypot(segments[:, 0], segments[:, 1]) / spacing), 1).astype(int)
+    segment_index = np.repeat(np.arange(len(segments)), num_steps)
+    fraction = (np.arange(len(segment_index))
+                - np.repeat(np.cumsum(num_steps) - num_steps, num_steps)) \
+        / np.repeat(num_steps, num_steps)
+    return coords[segment_index] + fraction[:, np.newaxis] \
+        * segments[segment_index]
+
+
+def boundary_error(geom, reference, spacing=ERROR_SPACING):
+    """
+    Hausdorff distance (kpc) between the boundaries of geom and reference,
+    i.e. the largest distance of a point on either boundary from the other
+    boundary. Both boundaries are sampled at points spacing (kpc) apart,
+    so the result is accurate to spacing/2.
+    """
+    # scipy is only imported when the error is measured
+    from scipy.spatial import cKDTree
+    points = np.concatenate(
+        [_densify(ring.coords, spacing) for ring in _boundary_rings(geom)])
+    reference_points = np.concatenate(
+        [_densify(ring.coords, spacing)
+         for ring in _boundary_rings(reference)])
+    distances, _ = cKDTree(reference_points).query(points)
+    reference_distances, _ = cKDTree(points).query(reference_points)
+    return max(distances.max(), reference_distances.max())
+
+
+def num_vertices(geom):
+    # the closing vertex of each ring is not counted
+    return sum(len(ring.coords) - 1 for ring in _boundary_rings(geom))
+
+
+def level_of_detail_report(geom, reference):
+    """
+    Parameters
+    ----------
+    geom: shapely Polygon or MultiPolygon
+        e.g. a simplified, or coarsely sampled, arm polygon
+    reference: shapely Polygon or MultiPolygon
+        the same arm at full detail
+
+    Returns
+    -------
+    dict with the keys
+    'vertices', 'reference_vertices': number of vertices of both polygons
+    'boundary_error_kpc': Hausdorff distance between the boundaries
+        (see boundary_error)
+    'area_error_kpc2': area covered by only one of the polygons
+    'area_error_fraction': area_error_kpc2 relative to the area of reference
+    """
+    area_error = geom.symmetric_difference(reference).area
+    return {'vertices': num_vertices(geom),
+            'reference_vertices': num_vertices(reference),
+            'boundary_error_kpc': boundary_error(geom, reference),
+            'area_error_kpc2': area_error,
+            'area_error_fraction': area_error / reference.area}
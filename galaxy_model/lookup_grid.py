@@ -0,0 +1,122 @@
+"""
+This module contains a precomputed raster lookup grid, used by Galaxy for
+fast (O(1) per coordinate) location checks of large catalogues.
+
+Every cell of the grid stores a bitmask of the geometries (spiral arms,
+spurs, bar) it is fully inside. Cells crossed by any geometry boundary are
+flagged, and coordinates falling into them (or outside of the grid) have to
+be checked with the exact test instead.
+"""
+
+import numpy as np
+from shapely.vectorized import contains
+
+from .shapes import Ellipse
+
+
+class LookupGrid:
+    """
+    Raster lookup grid over the (-x_radius, x_radius) x (-y_radius, y_radius)
+    plane.
+
+    Parameters
+    ----------
+    geometries: list
+        shapely (Multi)Polygons or analytic shapes (see shapes.py); the n-th
+        geometry is stored in the n-th bit of the bitmask
+    x_radius, y_radius: Number, Number
+        x- and y-radius (kpc) of the grid, starting from the Galactic Centre
+    cell_size: Number
+        size (kpc) of a (square) grid cell; smaller cells need more memory,
+        but fewer coordinates fall into boundary cells
+
+    Attributes
+    ----------
+    self.bitmask: numpy.ndarray of uint16, shape (ny, nx)
+        geometries each cell is fully inside
+    self.on_boundary: numpy.ndarray of bool, shape (ny, nx)
+        True if the cell is crossed by a geometry boundary
+    """
+
+    def __init__(self, geometries, x_radius=16, y_radius=16, cell_size=0.05):
+        assert cell_size > 0
+        assert len(geometries) <= 16
+        self.x_min = -x_radius
+        self.y_min = -y_radius
+        self.cell_size = cell_size
+        self.nx = int(np.ceil(2*x_radius/cell_size))
+        self.ny = int(np.ceil(2*y_radius/cell_size))
+        self.bitmask = np.zeros((self.ny, self.nx), dtype=np.uint16)
+        self.on_boundary = np.zeros((self.ny, self.nx), dtype=bool)
+
+        for geom in geometries:
+            self._flag_boundary_cells(geom)
+        x_centre = self.x_min + (np.arange(self.nx)+0.5)*cell_size
+        y_centre = self.y_min + (np.arange(self.ny)+0.5)*cell_size
+        x_centre, y_centre = np.meshgrid(x_centre, y_centre)
+        for bit, geom in enumerate(geometries):
+            # cells not crossed by a boundary are either fully inside or
+            # fully outside of the geometry, so their centre decides
+            if isinstance(geom, Ellipse):
+                inside = geom.contains(x_centre, y_centre)
+            else:
+                inside = contains(geom, x_centre, y_centre)
+            self.bitmask[inside & ~self.on_boundary] |= np.uint16(1 << bit)
+
+    @staticmethod
+    def _rings(geom):
+        # vertices of the boundary rings, and their maximum distance from
+        # the actual boundary
+        if isinstance(geom, Ellipse):
+            yield geom.outline()
+            return
+        polygons = getattr(geom, 'geoms', [geom])
+        for polygon in polygons:
+            yield np.asarray(polygon.exterior.coords), 0
+            for interior in polygon.interiors:
+                yield np.asarray(interior.coords), 0
+
+    def _flag_boundary_cells(self, geom):
+        for coords, max_error in self._rings(geom):
+            x_cell = (coords[:, 0] - self.x_min)/self.cell_size
+            y_cell = (coords[:, 1] - self.y_min)/self.cell_size
+            padding = max_error/self.cell_size
+            # every cell touched by the bounding box of a segment (padded by
+            # the error of the ring) is flagged; ceil()-1 also flags the
+            # lower neighbour when a vertex lies exactly on a cell edge
+            ix_begin = np.ceil(np.minimum(x_cell[:-1], x_cell[1:])
+                               - padding) - 1
+            ix_end = np.floor(np.maximum(x_cell[:-1], x_cell[1:]) + padding)
+            iy_begin = np.ceil(np.minimum(y_cell[:-1], y_cell[1:])
+                               - padding) - 1
+            iy_end = np.floor(np.maximum(y_cell[:-1], y_cell[1:]) + padding)
+            ix_begin = np.clip(ix_begin, 0, self.nx-1).astype(int)
+            ix_end = np.clip(ix_end, 0, self.nx-1).astype(int)
+            iy_begin = np.clip(iy_begin, 0, self.ny-1).astype(int)
+            iy_end = np.clip(iy_end, 0, self.ny-1).astype(int)
+            for ix0, ix1, iy0, iy1 in zip(ix_begin, ix_end,
+                                          iy_begin, iy_end):
+                self.on_boundary[iy0:iy1+1, ix0:ix1+1] = True
+
+    def lookup(self, x, y):
+        """
+        Parameters
+        ----------
+        x, y: numpy.ndarray, numpy.ndarray (same shape)
+
+        Returns
+        -------
+        bitmask: numpy.ndarray of uint16
+            geometries the coordinates are in; only valid where is_exact
+        is_exact: numpy.ndarray of bool
+            False if the coordinate is in a boundary cell or outside of the
+            grid, i.e. needs the exact test
+        """
+        ix = np.floor((x - self.x_min)/self.cell_size)
+        iy = np.floor((y - self.y_min)/self.cell_size)
+        on_grid = (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny)
+        ix = np.where(on_grid, ix, 0).astype(np.intp)
+        iy = np.where(on_grid, iy, 0).astype(np.intp)
+        bitmask = np.where(on_grid, self.bitmask[iy, ix], 0).astype(np.uint16)
+        is_exact = on_grid & ~self.on_boundary[iy, ix]
+        return bitmask, is_exact
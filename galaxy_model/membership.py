@@ -0,0 +1,95 @@
+"""
+This module computes Monte Carlo membership probabilities of sources with
+uncertain (heliocentric) distances, used by Galaxy.membershipProbabilities.
+
+Each source gets num_samples distances drawn along its line of sight, from
+a normal distribution (truncated at zero distance) of the given mean and
+standard deviation. All the samples are located in one vectorized pass,
+chunk by chunk, so that the memory use stays bounded by chunk_size samples
+no matter how many sources and samples are given.
+"""
+
+import numpy as np
+
+from .coordinates import heliocentric_to_galactocentric
+
+
+def _sample_distances(rng, dist_kpc, dist_err_kpc, num_samples):
+    # inverse transform sampling of the normal distributions truncated at
+    # zero distance, shape (num_sources, num_samples)
+    from scipy.special import ndtr, ndtri
+    mean = dist_kpc[:, np.newaxis]
+    sigma = dist_err_kpc[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cdf_at_zero = ndtr(-mean / sigma)
+        u = cdf_at_zero + (1 - cdf_at_zero) * rng.random(
+            (len(dist_kpc), num_samples))
+        samples = mean + sigma * ndtri(u)
+    return np.where(sigma > 0, np.maximum(samples, 0), mean)
+
+
+def membership_probabilities(galaxy, glon, glat, dist_kpc, dist_err_kpc,
+                             num_samples=1000, chunk_size=1000000, seed=None,
+                             solar_dist=8.15, z_sun=0.0055,
+                             use_lookup_grid=False, check_height=False):
+    """
+    Parameters
+    ----------
+    galaxy: Galaxy
+    glon, glat: array_like, array_like
+        Galactic longitude and latitude (decimal degrees)
+    dist_kpc, dist_err_kpc: array_like, array_like
+        Heliocentric distance (kpc) and its uncertainty (standard deviation)
+    num_samples: int
+        number of distance samples per source
+    chunk_size: int
+        (maximum) number of samples located at once
+    seed: int (optional)
+        seed of the random distance samples
+    solar_dist, z_sun, use_lookup_grid, check_height:
+        see Galaxy.isOnSpiralArmOrSpurLBD
+
+    Returns
+    -------
+    dict of numpy.ndarray of float, each of the same length as glon: the
+    fraction of samples of each source within each spiral arm, spur and the
+    bar, keyed by Galaxy.location_names
+    """
+    glon, glat, dist_kpc, dist_err_kpc = (
+        array.ravel() for array in np.broadcast_arrays(
+            np.asarray(glon, dtype=float), np.asarray(glat, dtype=float),
+            np.asarray(dist_kpc, dtype=float),
+            np.asarray(dist_err_kpc, dtype=float)))
+    assert num_samples > 0 and chunk_size > 0
+    assert np.all(dist_err_kpc >= 0)
+    names = galaxy._geometry_names()
+    counts = np.zeros((len(names), len(glon)), dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    # the transformation is affine in the distance, so that the samples of
+    # a source lie on the line x_0 + distance*x_direction (same for y, z),
+    # where (x_0, y_0, z_0) is the position of the Sun
+    x_0, y_0, z_0 = heliocentric_to_galactocentric(0, 0, 0, solar_dist,
+                                                   z_sun)
+    x_direction, y_direction, z_direction = heliocentric_to_galactocentric(
+        glon, glat, 1, solar_dist, z_sun)
+    x_direction -= x_0
+    y_direction -= y_0
+    z_direction -= z_0
+
+    sources_per_chunk = max(1, chunk_size // num_samples)
+    for start in range(0, len(glon), sources_per_chunk):
+        chunk = slice(start, start+sources_per_chunk)
+        samples = _sample_distances(rng, dist_kpc[chunk], dist_err_kpc[chunk],
+                                    num_samples)
+        x = x_0 + samples * x_direction[chunk, np.newaxis]
+        y = y_0 + samples * y_direction[chunk, np.newaxis]
+        bitmask = galaxy._batch_bitmask(x, y, use_lookup_grid)
+        if check_height:
+            z = z_0 + samples * z_direction[chunk, np.newaxis]
+            # the arms and spurs are cut at their height, the bar is not
+            bitmask[~galaxy._within_height(x, y, z)] &= galaxy._bar_bit
+        for bit in range(len(names)):
+            counts[bit, chunk] = np.count_nonzero((bitmask >> bit) & 1,
+                                                  axis=1)
+
+    return {name: count / num_samples for name, count in zip(names, counts)}
@@ -0,0 +1,87 @@
+"""
+This module contains the process-pool classification used by
+Galaxy.isOnSpiralArmOrSpurParallel.
+
+The input coordinates are split into chunks, which are classified by
+Galaxy.isOnSpiralArmOrSpurBatch on a pool of worker processes. The workers
+receive the pre-built Galaxy once, at start-up: on Linux, when no other
+threads are running, the 'fork' start method is used and it is simply
+inherited from the parent process; otherwise (e.g. macOS, or when called
+from a thread of the classification service, where forking could deadlock
+the workers) the platform default start method is used and it is pickled
+once per worker, never per task.
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+
+import numpy as np
+
+# Galaxy instance of a worker process, set by _init_worker
+_worker_galaxy = None
+
+
+def _init_worker(galaxy):
+    global _worker_galaxy
+    _worker_galaxy = galaxy
+
+
+def _classify_chunk(args):
+    x_chunk, y_chunk, use_lookup_grid = args
+    return _worker_galaxy.isOnSpiralArmOrSpurBatch(
+        x_chunk, y_chunk, use_lookup_grid=use_lookup_grid)
+
+
+def _chunks(x, y, chunk_size, use_lookup_grid):
+    for start in range(0, len(x), chunk_size):
+        yield (x[start:start+chunk_size], y[start:start+chunk_size],
+               use_lookup_grid)
+
+
+def classify_parallel(galaxy, x_coord, y_coord, processes=None,
+                      chunk_size=1000000, use_lookup_grid=False):
+    """
+    Parameters
+    ----------
+    galaxy: Galaxy
+    x_coord, y_coord: array_like of numericals (same shape)
+    processes: int (optional)
+        number of worker processes; defaults to the number of cores
+    chunk_size: int
+        number of coordinates classified per task
+    use_lookup_grid: bool
+        see Galaxy.isOnSpiralArmOrSpurBatch
+
+    Returns
+    -------
+    numpy.ndarray of int, with the same shape as x_coord, identical to
+    Galaxy.isOnSpiralArmOrSpurBatch(x_coord, y_coord)
+    """
+    x = np.asarray(x_coord, dtype=float)
+    y = np.asarray(y_coord, dtype=float)
+    assert x.shape == y.shape
+    assert chunk_size > 0
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, -(-x.size // chunk_size)))
+    if processes == 1:
+        return galaxy.isOnSpiralArmOrSpurBatch(
+            x, y, use_lookup_grid=use_lookup_grid)
+
+    if use_lookup_grid and galaxy.lookup_grid is None:
+        # build it once here, rather than once per worker
+        galaxy.build_lookup_grid()
+    if sys.platform.startswith("linux") and threading.active_count() == 1:
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+
+    with context.Pool(processes, initializer=_init_worker,
+                      initargs=(galaxy,)) as pool:
+        # imap keeps the results in input order
+        results = list(pool.imap(_classify_chunk,
+                                 _chunks(x.ravel(), y.ravel(), chunk_size,
+                                         use_lookup_grid)))
+    return np.concatenate(results).reshape(x.shape)
@@ -0,0 +1,345 @@
+"""
+This module contains a long-running local classification service: the
+spiral arm geometry is built once and kept warm, and concurrent (small)
+requests of any number of clients are merged into vectorized batches.
+
+The service listens on a UNIX socket, or on a localhost TCP port; it needs
+no network access. The protocol is one JSON object per line, in both
+directions:
+
+    request:  {"id": 1, "op": "classify", "x": [0.5, ...], "y": [10, ...]}
+    response: {"id": 1, "result": [1, ...]}
+              or {"id": 1, "error": "..."}
+
+where op is one of
+
+- 'classify': location encodings as in Galaxy.isOnSpiralArmOrSpur
+- 'bitmask': location bitmasks as in Galaxy.locationBitmask
+- 'info': location names (see Galaxy.location_names) and service statistics
+
+Requests on one connection may be pipelined; the responses are matched by
+their id. A request line longer than max_request_bytes is answered with an
+error whose id is null. See service_client.py for a client, and run it as
+
+    python -m galaxy_model.service --socket /tmp/galaxy_model.sock
+    python -m galaxy_model.service --port 8765
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+_OPS = ('classify', 'bitmask', 'info')
+
+
+class ClassificationService:
+    """
+    Parameters
+    ----------
+    galaxy: Galaxy (optional)
+        the (pre-built) model to classify with; a default Galaxy is built
+        if None
+    max_batch_size: int
+        maximum number of coordinates classified in one batch; a single
+        bigger request is classified on its own
+    max_delay_s: Number
+        how long (s) a request may wait for others to share its batch;
+        while a batch is classified, new requests are queued anyway
+    use_lookup_grid: bool
+        see Galaxy.isOnSpiralArmOrSpurBatch; the grid is built on start
+    max_request_bytes: int
+        maximum length of a request line; longer requests are skipped and
+        answered with an error
+    max_pending_requests: int
+        maximum number of requests of a connection in flight at once; the
+        connection is not read any further until some of them are answered
+
+    Attributes
+    ----------
+    self.address: str or tuple
+        socket path, or (host, port), the service listens on once started
+    self.stats: dict
+        number of 'requests', 'batches' and 'coordinates' classified
+
+    Methods
+    -------
+    start(socket_path=None, host='127.0.0.1', port=None)
+        start listening (coroutine)
+    serve_forever()
+        serve the clients until cancelled (coroutine)
+    classify(x_coord: array_like, y_coord: array_like)
+        location bitmasks and encodings, batched with the requests of the
+        clients (coroutine)
+    close()
+        stop listening and classifying (coroutine)
+    """
+
+    def __init__(self, galaxy=None, max_batch_size=100000, max_delay_s=0.002,
+                 use_lookup_grid=False, max_request_bytes=2**26,
+                 max_pending_requests=64):
+        assert max_batch_size > 0 and max_delay_s >= 0
+        assert max_pending_requests > 0
+        if galaxy is None:
+            from .galaxy import Galaxy
+            galaxy = Galaxy()
+        self.galaxy = galaxy
+        self.max_batch_size = max_batch_size
+        self.max_delay_s = max_delay_s
+        self.use_lookup_grid = use_lookup_grid
+        self.max_request_bytes = max_request_bytes
+        self.max_pending_requests = max_pending_requests
+        if use_lookup_grid and galaxy.lookup_grid is None:
+            galaxy.build_lookup_grid()
+        self.address = None
+        self.stats = {'requests': 0, 'batches': 0, 'coordinates': 0}
+        self._server = None
+        # queued requests: (x, y, future)
+        self._pending = deque()
+        self._has_pending = None
+        self._batcher = None
+        # the classification runs off the event loop, so that requests
+        # keep being read (and queued for the next batch) meanwhile
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def start(self, socket_path=None, host='127.0.0.1', port=None):
+        """
+        Listen on the UNIX socket socket_path if given, otherwise on the TCP
+        port (0 picks a free one, see self.address) of host.
+        """
+        assert (socket_path is None) != (port is None)
+        self._has_pending = asyncio.Event()
+        self._batcher = asyncio.ensure_future(self._batch_loop())
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection, socket_path,
+                limit=self.max_request_bytes)
+            self.address = socket_path
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_connection, host, port,
+                limit=self.max_request_bytes)
+            self.address = self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+        self._executor.shutdown(wait=True)
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def _classify(self, x, y):
+        bitmask = self.galaxy._batch_bitmask(x, y, self.use_lookup_grid)
+        return bitmask, self.galaxy._bitmask_to_location_encoding(bitmask)
+
+    async def _next_batch(self):
+        while not self._pending:
+            self._has_pending.clear()
+            await self._has_pending.wait()
+        if self.max_delay_s > 0 and len(self._pending) == 1:
+            await asyncio.sleep(self.max_delay_s)
+        batch = [self._pending.popleft()]
+        size = len(batch[0][0])
+        while self._pending and \
+                size + len(self._pending[0][0]) <= self.max_batch_size:
+            batch.append(self._pending.popleft())
+            size += len(batch[-1][0])
+        return batch
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            x = np.concatenate([x_request for x_request, _, _ in batch])
+            y = np.concatenate([y_request for _, y_request, _ in batch])
+            try:
+                bitmask, encoding = await loop.run_in_executor(
+                    self._executor, self._classify, x, y)
+            except Exception as error:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.stats['batches'] += 1
+            self.stats['coordinates'] += len(x)
+            start = 0
+            for x_request, _, future in batch:
+                end = start + len(x_request)
+                if not future.done():
+                    future.set_result((bitmask[start:end],
+                                       encoding[start:end]))
+                start = end
+
+    async def classify(self, x_coord, y_coord):
+        """
+        Location bitmasks and encodings of the coordinates, classified
+        together with any other requests queued meanwhile.
+        """
+        x = np.asarray(x_coord, dtype=float).ravel()
+        y = np.asarray(y_coord, dtype=float).ravel()
+        assert x.shape == y.shape
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((x, y, future))
+        self._has_pending.set()
+        return await future
+
+    async def _response(self, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            op = request.get('op', 'classify')
+            if op not in _OPS:
+                raise ValueError("unknown op {!r}".format(op))
+            self.stats['requests'] += 1
+            if op == 'info':
+                return {'id': request_id,
+                        'result': {'location_names':
+                                   self.galaxy.location_names,
+                                   'stats': dict(self.stats)}}
+            if len(request['x']) != len(request['y']):
+                raise ValueError("x and y differ in length")
+            bitmask, encoding = await self.classify(request['x'],
+                                                    request['y'])
+            result = encoding if op == 'classify' else bitmask
+            return {'id': request_id, 'result': result.tolist()}
+        except Exception as error:
+            return {'id': request_id,
+                    'error': "{}: {}".format(type(error).__name__, error)}
+
+    async def _write(self, response, writer, write_lock):
+        async with write_lock:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+    async def _respond(self, line, writer, write_lock):
+        await self._write(await self._response(line), writer, write_lock)
+
+    @staticmethod
+    async def _read_line(reader):
+        """
+        The next line (b"" at the end of the stream), or None if it is
+        longer than the limit of reader, in which case it is skipped.
+        """
+        try:
+            return await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as error:
+            return error.partial
+        except asyncio.LimitOverrunError as error:
+            consumed = error.consumed
+        # skip the rest of the line, limit bytes at a time
+        while True:
+            await reader.readexactly(consumed)
+            try:
+                await reader.readuntil(b"\n")
+                return None
+            except asyncio.IncompleteReadError:
+                return None
+            except asyncio.LimitOverrunError as error:
+                consumed = error.consumed
+
+    async def _handle_connection(self, reader, writer):
+        write_lock = asyncio.Lock()
+        # requests in flight; reading stops while all slots are taken, so
+        # that a client pipelining requests faster than they are answered
+        # is slowed down instead of queueing them without bound
+        in_flight = asyncio.Semaphore(self.max_pending_requests)
+        pending = set()
+        try:
+            while True:
+                await in_flight.acquire()
+                try:
+                    line = await self._read_line(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                if line is None:
+                    request = self._write(
+                        {'id': None,
+                         'error': "ValueError: request longer than {} "
+                         "bytes".format(self.max_request_bytes)},
+                        writer, write_lock)
+                elif line:
+                    request = self._respond(line, writer, write_lock)
+                else:
+                    break
+                task = asyncio.ensure_future(request)
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                task.add_done_callback(lambda _: in_flight.release())
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            writer.close()
+
+
+async def _serve(service, socket_path, host, port):
+    await service.start(socket_path, host, port)
+    print("galaxy_model service listening on {}".format(service.address),
+          flush=True)
+    serving = asyncio.ensure_future(service.serve_forever())
+    # shut down cleanly (e.g. removing the socket file) when interrupted
+    # or terminated
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, serving.cancel)
+    try:
+        await serving
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await service.close()
+
+
+def serve(socket_path=None, host='127.0.0.1', port=None, **kwargs):
+    """
+    Run a ClassificationService (kwargs, see there) until interrupted
+    (SIGINT) or terminated (SIGTERM).
+    """
+    service = ClassificationService(**kwargs)
+    asyncio.run(_serve(service, socket_path, host, port))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument("--socket", help="UNIX socket path to listen on")
+    address.add_argument("--port", type=int,
+                         help="localhost TCP port to listen on")
+    parser.add_argument("--host", default='127.0.0.1',
+                        help="address of the TCP port (default: localhost)")
+    parser.add_argument("--max-batch-size", type=int, default=100000)
+    parser.add_argument("--max-delay-ms", type=float, default=2,
+                        help="how long a request may wait for others to "
+                        "share its batch")
+    parser.add_argument("--lookup-grid", action="store_true",
+                        help="classify with the lookup grid")
+    parser.add_argument("--geometry-cache-dir",
+                        help="on-disk cache of the spiral arm geometry")
+    args = parser.parse_args()
+
+    from .galaxy import Galaxy
+    serve(args.socket, args.host, args.port,
+          galaxy=Galaxy(geometry_cache_dir=args.geometry_cache_dir),
+          max_batch_size=args.max_batch_size,
+          max_delay_s=args.max_delay_ms / 1000,
+          use_lookup_grid=args.lookup_grid)
+
+
+if __name__ == "__main__":
+    main()
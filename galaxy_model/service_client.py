@@ -0,0 +1,133 @@
+"""
+This module contains a (blocking) client of the local classification service
+(see service.py). It only needs NumPy, so pipeline stages using it don't pay
+for building, or even importing, the model.
+
+    with ClassificationClient(socket_path="/tmp/galaxy_model.sock") as client:
+        codes = client.classify(x, y)
+"""
+
+import json
+import socket
+import time
+
+import numpy as np
+
+
+class ClassificationClient:
+    """
+    Parameters
+    ----------
+    socket_path: str (optional)
+        UNIX socket of the service
+    host, port: str, int (optional)
+        localhost TCP address of the service, if socket_path is not given
+    timeout: Number (optional)
+        socket timeout (s); None (default) waits forever
+    connect_timeout: Number
+        how long (s) to keep retrying to connect, e.g. while the service is
+        still starting up
+
+    Methods
+    -------
+    classify(x_coord: array_like, y_coord: array_like)
+        location encodings, see Galaxy.isOnSpiralArmOrSpur
+    location_bitmask(x_coord: array_like, y_coord: array_like)
+        location bitmasks, see Galaxy.locationBitmask
+    info()
+        location names and statistics of the service
+    close()
+        close the connection
+    """
+
+    def __init__(self, socket_path=None, host='127.0.0.1', port=None,
+                 timeout=None, connect_timeout=0):
+        assert (socket_path is None) != (port is None)
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                self._socket = self._connect(socket_path, host, port)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.05)
+        self._socket.settimeout(timeout)
+        self._file = self._socket.makefile('rwb')
+        self._next_id = 0
+
+    @staticmethod
+    def _connect(socket_path, host, port):
+        if socket_path is None:
+            return socket.create_connection((host, port))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def _request(self, op, **kwargs):
+        request_id = self._next_id
+        self._next_id += 1
+        self._file.write(json.dumps(dict(id=request_id, op=op, **kwargs))
+                         .encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("the service closed the connection")
+        response = json.loads(line)
+        # the id of a request the service could not read is None
+        assert response['id'] in (request_id, None)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    def _coordinates_request(self, op, x_coord, y_coord):
+        x = np.asarray(x_coord, dtype=float)
+        y = np.asarray(y_coord, dtype=float)
+        assert x.shape == y.shape
+        return x.shape, self._request(op, x=x.ravel().tolist(),
+                                      y=y.ravel().tolist())
+
+    def classify(self, x_coord, y_coord):
+        """
+        Returns
+        -------
+        numpy.ndarray of int, with the same shape as x_coord, see
+        Galaxy.isOnSpiralArmOrSpurBatch
+        """
+        shape, result = self._coordinates_request('classify', x_coord,
+                                                  y_coord)
+        return np.array(result, dtype=np.int64).reshape(shape)
+
+    def location_bitmask(self, x_coord, y_coord):
+        """
+        Returns
+        -------
+        numpy.ndarray of uint16, with the same shape as x_coord, see
+        Galaxy.locationBitmask
+        """
+        shape, result = self._coordinates_request('bitmask', x_coord,
+                                                  y_coord)
+        return np.array(result, dtype=np.uint16).reshape(shape)
+
+    def info(self):
+        """
+        Returns
+        -------
+        dict with the keys 'location_names' (see Galaxy.location_names) and
+        'stats' (see ClassificationService)
+        """
+        return self._request('info')
@@ -0,0 +1,114 @@
+"""
+This module contains the analytic shapes of the simplified Galaxy components,
+i.e. the (circular) spurs and the (elliptical) Galactic bar.
+
+Unlike shapely polygon approximations, their location checks are exact, and
+vectorized distance arithmetic only, so they cost next to nothing at any
+catalogue size.
+"""
+
+import numpy as np
+
+
+class Ellipse:
+    """
+    Parameters
+    ----------
+    x, y: Number, Number
+        centre (kpc)
+    semi_major, semi_minor: Number, Number
+        semi-axes (kpc)
+    angle: Number
+        counter-clockwise rotation (deg) of the major axis from the x-axis
+
+    Methods
+    -------
+    contains(x: array_like, y: array_like)
+        whether the coordinates are (strictly) inside of the shape
+    outline(num_vertices=256)
+        vertices along the boundary, and their maximum distance from it
+    patch(**kwargs)
+        matplotlib patch of the shape
+    """
+
+    def __init__(self, x, y, semi_major, semi_minor, angle=0):
+        self.x = x
+        self.y = y
+        self.semi_major = semi_major
+        self.semi_minor = semi_minor
+        self.angle = angle
+
+    def __repr__(self):
+        return "{}({}, {}, {}, {}, {})".format(
+            type(self).__name__, self.x, self.y, self.semi_major,
+            self.semi_minor, self.angle)
+
+    @property
+    def bounds(self):
+        # same order as shapely: x_min, y_min, x_max, y_max
+        c, s = np.cos(np.deg2rad(self.angle)), np.sin(np.deg2rad(self.angle))
+        x_half = np.hypot(self.semi_major*c, self.semi_minor*s)
+        y_half = np.hypot(self.semi_major*s, self.semi_minor*c)
+        return (self.x - x_half, self.y - y_half,
+                self.x + x_half, self.y + y_half)
+
+    def contains(self, x, y):
+        dx = np.asarray(x) - self.x
+        dy = np.asarray(y) - self.y
+        c, s = np.cos(np.deg2rad(self.angle)), np.sin(np.deg2rad(self.angle))
+        u = (dx*c + dy*s) / self.semi_major
+        v = (dy*c - dx*s) / self.semi_minor
+        return u*u + v*v < 1
+
+    def outline(self, num_vertices=256):
+        """
+        Returns
+        -------
+        coords: numpy.ndarray of shape (num_vertices+1, 2)
+            closed ring of vertices on the boundary
+        max_error: float
+            upper bound (kpc) of the distance between the boundary and the
+            ring (the ellipse is an affine image of a circle, so the
+            sagitta of the unit circle scales with the semi-major axis)
+        """
+        t = np.linspace(0, 2*np.pi, num_vertices + 1)
+        c, s = np.cos(np.deg2rad(self.angle)), np.sin(np.deg2rad(self.angle))
+        u = self.semi_major*np.cos(t)
+        v = self.semi_minor*np.sin(t)
+        coords = np.column_stack((self.x + u*c - v*s, self.y + u*s + v*c))
+        max_error = self.semi_major * (1 - np.cos(np.pi / num_vertices))
+        return coords, max_error
+
+    def patch(self, **kwargs):
+        # matplotlib is only imported when plotting
+        from matplotlib.patches import Ellipse as EllipsePatch
+        return EllipsePatch(xy=(self.x, self.y), width=2*self.semi_major,
+                            height=2*self.semi_minor, angle=self.angle,
+                            **kwargs)
+
+
+class Circle(Ellipse):
+    """
+    Parameters
+    ----------
+    x, y: Number, Number
+        centre (kpc)
+    radius: Number
+        radius (kpc)
+    """
+
+    def __init__(self, x, y, radius):
+        super(Circle, self).__init__(x, y, radius, radius)
+        self.radius = radius
+
+    def __repr__(self):
+        return "Circle({}, {}, {})".format(self.x, self.y, self.radius)
+
+    def contains(self, x, y):
+        dx = np.asarray(x) - self.x
+        dy = np.asarray(y) - self.y
+        return dx*dx + dy*dy < self.radius*self.radius
+
+    def patch(self, **kwargs):
+        from matplotlib.patches import Circle as CirclePatch
+        return CirclePatch((self.x, self.y), self.radius, **kwargs)
@@ -0,0 +1,155 @@
+"""
+This module contains the store of user-inserted source coordinates used by
+Galaxy.add_coord and Galaxy.remove_coord.
+
+The coordinates are kept in a growable NumPy buffer, along with a hash index
+from coordinate to buffer positions, so that adding or removing m coordinates
+costs O(m) (amortised), regardless of the number of stored coordinates.
+Removed coordinates are only flagged, and the buffer is compacted once
+more than half of it is removed.
+"""
+
+from collections import deque
+
+import numpy as np
+
+
+class SourceStore:
+    """
+    Attributes
+    ----------
+    self.x, self.y: numpy.ndarray, numpy.ndarray
+        stored x- and y- coordinates, in insertion order; read-only views
+        of the buffer, which later adds and removes never modify (the
+        buffer is reallocated instead)
+
+    Methods
+    -------
+    add(x_coord: array_like, y_coord: array_like)
+        append coordinates
+    remove(x_coord: array_like, y_coord: array_like)
+        remove coordinates (one stored occurrence per given coordinate,
+        the earliest inserted first)
+    """
+
+    def __init__(self, capacity=1024):
+        self._coords = np.empty((capacity, 2))
+        self._alive = np.zeros(capacity, dtype=bool)
+        # number of buffer positions in use, including removed ones
+        self._size = 0
+        self._num_removed = 0
+        # x+iy -> position in the buffer, or deque of positions (ascending)
+        # if the coordinate is stored more than once
+        self._index = {}
+
+    def __len__(self):
+        return self._size - self._num_removed
+
+    @property
+    def x(self):
+        return self._column(0)
+
+    @property
+    def y(self):
+        return self._column(1)
+
+    def _column(self, i):
+        if self._num_removed == 0:
+            column = self._coords[:self._size, i]
+        else:
+            column = self._coords[:self._size, i][self._alive[:self._size]]
+        # writing into a view would bypass the index of the coordinates
+        column.flags.writeable = False
+        return column
+
+    def _reserve(self, capacity):
+        if capacity <= len(self._coords):
+            return
+        new_capacity = max(capacity, 2*len(self._coords))
+        coords = np.empty((new_capacity, 2))
+        coords[:self._size] = self._coords[:self._size]
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._coords = coords
+        self._alive = alive
+
+    @staticmethod
+    def _keys(coords):
+        # complex numbers x+iy are cheaper to create and hash than tuples,
+        # and compare equal exactly when both x and y do
+        return np.ascontiguousarray(coords).view(np.complex128).ravel(
+            ).tolist()
+
+    def _index_positions(self, coords, first_position):
+        keys = self._keys(coords)
+        positions = dict(zip(keys, range(first_position,
+                                         first_position+len(keys))))
+        if len(positions) == len(keys) and self._index.keys().isdisjoint(
+                positions):
+            # fast path: no coordinate is stored more than once
+            self._index.update(positions)
+            return
+        for position, key in enumerate(keys, first_position):
+            stored = self._index.get(key)
+            if stored is None:
+                self._index[key] = position
+            elif isinstance(stored, deque):
+                stored.append(position)
+            else:
+                self._index[key] = deque([stored, position])
+
+    def _compact(self):
+        # into a new buffer, so that the arrays returned by x and y so far
+        # keep their values
+        coords = self._coords[:self._size][self._alive[:self._size]]
+        self._size = len(coords)
+        self._num_removed = 0
+        self._coords = np.empty_like(self._coords)
+        self._coords[:self._size] = coords
+        self._alive[:self._size] = True
+        self._alive[self._size:] = False
+        self._index = {}
+        self._index_positions(coords, 0)
+
+    def add(self, x_coord, y_coord):
+        coords = np.column_stack((np.asarray(x_coord, dtype=float).ravel(),
+                                  np.asarray(y_coord, dtype=float).ravel()))
+        self._reserve(self._size + len(coords))
+        self._coords[self._size:self._size+len(coords)] = coords
+        self._alive[self._size:self._size+len(coords)] = True
+        self._index_positions(coords, self._size)
+        self._size += len(coords)
+
+    def remove(self, x_coord, y_coord):
+        """
+        Returns
+        -------
+        missing: list
+            coordinates (x, y) not found in the store
+        ambiguous: list
+            coordinates (x, y) stored more than once at the time of removal,
+            of which only the earliest inserted one was removed
+        """
+        coords = np.column_stack((np.asarray(x_coord, dtype=float).ravel(),
+                                  np.asarray(y_coord, dtype=float).ravel()))
+        missing = []
+        ambiguous = []
+        removed_positions = []
+        for key in self._keys(coords):
+            stored = self._index.get(key)
+            if stored is None:
+                missing.append((key.real, key.imag))
+            elif isinstance(stored, deque):
+                ambiguous.append((key.real, key.imag))
+                removed_positions.append(stored.popleft())
+                if len(stored) == 1:
+                    self._index[key] = stored[0]
+            else:
+                removed_positions.append(stored)
+                del self._index[key]
+
+        self._alive[removed_positions] = False
+        self._num_removed += len(removed_positions)
+        if self._num_removed > self._size // 2:
+            self._compact()
+        return missing, ambiguous
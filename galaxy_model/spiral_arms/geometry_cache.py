@@ -0,0 +1,106 @@
+"""
+This module contains an (opt-in) on-disk cache for the constructed spiral arm
+geometry, i.e. the spine arrays and the polygon vertices, stored as npz files.
+
+The cache key is a hash of the arm class, its spiral parameters, its tuning
+window, its angular step and the package version, so that any change of
+those invalidates the cached geometry automatically.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+from .. import __version__
+
+
+def geometry_cache_key(arm):
+    """
+    Parameters
+    ----------
+    arm: SpiralArm
+        (partially initialised) spiral arm; its params* dicts,
+        tuning_window and angular_step need to be set
+
+    Returns
+    -------
+    Hex digest identifying the geometry of the arm
+    """
+    params = {name: value for name, value in sorted(vars(arm).items())
+              if name.startswith('params') and isinstance(value, dict)}
+    description = {'arm': type(arm).__module__ + '.' + type(arm).__qualname__,
+                   'params': params,
+                   'tuning_window': arm.tuning_window,
+                   'angular_step': arm.angular_step,
+                   'version': __version__}
+    return hashlib.sha256(json.dumps(description, sort_keys=True,
+                                     default=str).encode()).hexdigest()
+
+
+def _cache_path(cache_dir, key):
+    return os.path.join(cache_dir, "spiral_arm_{}.npz".format(key))
+
+
+def load_geometry(cache_dir, key):
+    """
+    Returns
+    -------
+    dict of attribute name -> numpy.ndarray (or list of numpy.ndarray),
+    or None if nothing (readable) is cached under the key
+    """
+    try:
+        with np.load(_cache_path(cache_dir, key)) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+
+    # list-valued attributes (e.g. near/far sides of ThreeKpcArm) are
+    # stored as "<name>/<index>"
+    geometry = {}
+    for name, value in arrays.items():
+        attr_name, _, index = name.partition("/")
+        if index:
+            geometry.setdefault(attr_name, {})[int(index)] = value
+        else:
+            geometry[name] = value
+    for attr_name, value in geometry.items():
+        if isinstance(value, dict):
+            geometry[attr_name] = [value[i] for i in sorted(value)]
+    return geometry
+
+
+def save_geometry(cache_dir, key, geometry):
+    """
+    Parameters
+    ----------
+    cache_dir: str
+        directory of the cache; created if it does not exist
+    key: str
+        see geometry_cache_key
+    geometry: dict
+        attribute name -> numpy.ndarray (or list of numpy.ndarray)
+    """
+    arrays = {}
+    for name, value in geometry.items():
+        if isinstance(value, list):
+            for i, part in enumerate(value):
+                arrays["{}/{}".format(name, i)] = np.asarray(part)
+        else:
+            arrays[name] = np.asarray(value)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # write to a temporary file first, so that concurrent processes never
+    # read a half-written cache file
+    fd, tmp_path = tempfile.mkstemp(suffix=".npz", dir=cache_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, _cache_path(cache_dir, key))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -2,25 +2,32 @@
 This module use SpiralArm superclass to create local arm.
 """
 
-from .spiral_parameters import Local
-from .spiral_property import CylinderSize
+import numpy as np
+
+from .spiral_parameters import with_overrides
 from .spiral_arm_superclass import SpiralArm
 
 
 class LocalArm(SpiralArm):
 
-    def __init__(self):
-        super(LocalArm, self).__init__(Local, 'cyan', 3)
+    parameter_sets = ('Local',)
+
+    def __init__(self, cache_dir=None, param_overrides=None,
+                 instrumentation=None, angular_step=1):
+        super(LocalArm, self).__init__(
+            with_overrides('Local', param_overrides), 'cyan', 3,
+            cache_dir, instrumentation, angular_step)
 
     def __repr__(self):
         return "Local"
 
-    def _radii_factory(self, B):
+    def spine_radius(self, B):
         return self._spine_radius_at_B_and_psi(
-            B, self.params['B-kink'],
+            np.asarray(B), self.params['B-kink'],
             self.params['psi'],
             self.params['R-kink'])
 
-    def _width_factory(self, B, r):
-        return CylinderSize.width_kpc(
-            self.params['w-kink'], r, self.params['R-kink']) + 0.2
+    def width(self, B, r=None):
+        if r is None:
+            r = self.spine_radius(B)
+        return self._cylinder_width(self.params, r) + 0.2
@@ -4,98 +4,65 @@ This module use SpiralArm superclass, with some modifications,
 """
 
 import numpy as np
-from scipy.signal import savgol_filter
 
-from .spiral_parameters import Norma, Outer
-from . import spiral_property as spiral_eq
+from .spiral_parameters import with_overrides
 from .spiral_arm_superclass import SpiralArm
 
 
 class NormaOuterArm(SpiralArm):
-    def __init__(self):
-        self.params_norma = Norma
-        self.params_outer = Outer
-        super(NormaOuterArm, self).__init__(Norma, 'red', 301)
+    parameter_sets = ('Norma', 'Outer')
+
+    def __init__(self, cache_dir=None, param_overrides=None,
+                 instrumentation=None, angular_step=1):
+        self.params_norma = with_overrides('Norma', param_overrides)
+        self.params_outer = with_overrides('Outer', param_overrides)
+        super(NormaOuterArm, self).__init__(self.params_norma, 'red', 301,
+                                            cache_dir, instrumentation,
+                                            angular_step)
 
     def __repr__(self):
         return "NormaOuter"
 
-    def _radii_factory(self, B):
-        if B <= self.params_norma['B-kink']:
-            return self._spine_radius_at_B_and_psi(
-                B, self.params_norma['B-kink'],
-                self.params_norma['psi-before'],
-                self.params_norma['R-kink'])
-        elif (B > self.params_norma['B-kink']
-              and B < self.params_norma['l-tangency']):
-            return self._spine_radius_at_B_and_psi(
-                B, self.params_norma['B-kink'],
-                self.params_norma['psi-between'],
-                self.params_norma['R-kink'])
-        elif B > self.params_norma['l-tangency'] and B <= 300:
-            return self._spine_radius_at_B_and_psi(
-                B, self.params_norma['B-kink'],
-                self.params_norma['psi-after'],
-                self.params_norma['R-kink'])
-        elif B > 300 and B < self.params_outer['B-kink']:
-            return self._spine_radius_at_B_and_psi(
-                B, self.params_outer['B-kink'],
-                self.params_outer['psi-before'],
-                self.params_outer['R-kink'])
-        else:
-            return self._spine_radius_at_B_and_psi(
-                B, self.params_outer['B-kink'],
-                self.params_outer['psi-after'],
-                self.params_outer['R-kink'])
+    def spine_radius(self, B):
+        B = np.asarray(B)
+        conditions = [
+            B <= self.params_norma['B-kink'],
+            (B > self.params_norma['B-kink'])
+            & (B < self.params_norma['l-tangency']),
+            (B > self.params_norma['l-tangency']) & (B <= 300),
+            (B > 300) & (B < self.params_outer['B-kink'])]
+        is_norma = conditions[0] | conditions[1] | conditions[2]
+        B_kink = np.where(is_norma, self.params_norma['B-kink'],
+                          self.params_outer['B-kink'])
+        R_kink = np.where(is_norma, self.params_norma['R-kink'],
+                          self.params_outer['R-kink'])
+        psi = np.select(conditions,
+                        [self.params_norma['psi-before'],
+                         self.params_norma['psi-between'],
+                         self.params_norma['psi-after'],
+                         self.params_outer['psi-before']],
+                        default=self.params_outer['psi-after'])
+        return self._spine_radius_at_B_and_psi(B, B_kink, psi, R_kink)
 
-    def _width_factory(self, B, r):
-        if B < 350:
-            return spiral_eq.CylinderSize.width_kpc(
-                self.params_norma['w-kink'], r, self.params_norma['R-kink']) \
-                + 0.2
-        else:
-            return spiral_eq.CylinderSize.width_kpc(
-                self.params_outer['w-kink'], r, self.params_outer['R-kink']) \
-                + 0.2
+    def width(self, B, r=None):
+        B = np.asarray(B)
+        if r is None:
+            r = self.spine_radius(B)
+        return np.where(B < 350,
+                        self._cylinder_width(self.params_norma, r),
+                        self._cylinder_width(self.params_outer, r)) + 0.2
 
     def _fine_tuning(self, B, centre, param_cent, param_influence):
         distance = abs(centre-B)
         reduced_radii = param_cent-distance/param_influence
-        if reduced_radii > 0:
-            return reduced_radii
-        else:
-            return 0
-
-    # overwrhte this function to reduce the smoothing around tangent
-    def spine_radii_coords_b_range_and_width_with_smoothing(self):
-        r_spine = []
-        x_spine = []
-        y_spine = []
-        width_kpc = []
-        num_blist = (self.params['B-end']
-                     - self.params['B-begin']) + 1
-        B_list = np.linspace(
-                            self.params['B-begin'],
-                            self.params['B-end'],
-                            num_blist)
-        for B in B_list:
-            r = self._radii_factory(B)
-            w = self._width_factory(B, r)
-            r_spine.append(r)
-            width_kpc.append(w)
-
-        r_spine_moving_average = savgol_filter(r_spine, self.tuning_window, 1)
-        width_kpc_moving_average = savgol_filter(width_kpc,
-                                                 self.tuning_window, 1)
-        for B, r in zip(B_list, r_spine_moving_average):
-            final_r = r - self._fine_tuning(
-                                B, self.params_norma['l-tangency'], 0.7, 200)
-            if B <= self.params_norma['B-kink']:
-                final_r -= self._fine_tuning(
-                                B, self.params['B-begin'], 0.8, 50)
+        return np.maximum(reduced_radii, 0)
 
-            cartesian_coords = spiral_eq.polar_to_cartesian(final_r, B)
-            x_spine.append(cartesian_coords[0])
-            y_spine.append(cartesian_coords[1])
-        return (r_spine_moving_average,
-                x_spine, y_spine, B_list, width_kpc_moving_average)
+    # overwrite this hook to reduce the smoothing around tangent
+    def _fine_tune_spine(self, B, r):
+        final_r = r - self._fine_tuning(
+                            B, self.params_norma['l-tangency'], 0.7, 200)
+        final_r -= np.where(B <= self.params_norma['B-kink'],
+                            self._fine_tuning(
+                                B, self.params['B-begin'], 0.8, 50),
+                            0)
+        return final_r
@@ -2,30 +2,33 @@
 This module use SpiralArm superclass to create Perseus arm.
 """
 
-from .spiral_parameters import Perseus
-from . import spiral_property as spiral_eq
+import numpy as np
+
+from .spiral_parameters import with_overrides
 from .spiral_arm_superclass import SpiralArm
 
 
 class PerseusArm(SpiralArm):
-    def __init__(self):
-        super(PerseusArm, self).__init__(Perseus, 'black', 3)
+    parameter_sets = ('Perseus',)
+
+    def __init__(self, cache_dir=None, param_overrides=None,
+                 instrumentation=None, angular_step=1):
+        super(PerseusArm, self).__init__(
+            with_overrides('Perseus', param_overrides), 'black', 3,
+            cache_dir, instrumentation, angular_step)
 
     def __repr__(self):
         return "Perseus"
 
-    def _radii_factory(self, B):
-        if B <= self.params['B-kink']:
-            return self._spine_radius_at_B_and_psi(
-                B, self.params['B-kink'],
-                self.params['psi-before'],
-                self.params['R-kink'])
-        else:
-            return self._spine_radius_at_B_and_psi(
-                B, self.params['B-kink'],
-                self.params['psi-after'],
-                self.params['R-kink'])
-
-    def _width_factory(self, B, r):
-        return spiral_eq.CylinderSize.width_kpc(
-            self.params['w-kink'], r, self.params['R-kink'])+0.3
+    def spine_radius(self, B):
+        B = np.asarray(B)
+        psi = np.where(B <= self.params['B-kink'],
+                       self.params['psi-before'],
+                       self.params['psi-after'])
+        return self._spine_radius_at_B_and_psi(
+            B, self.params['B-kink'], psi, self.params['R-kink'])
+
+    def width(self, B, r=None):
+        if r is None:
+            r = self.spine_radius(B)
+        return self._cylinder_width(self.params, r)+0.3
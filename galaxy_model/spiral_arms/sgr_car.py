@@ -2,35 +2,41 @@
 This module use SpiralArm superclass to create Sgr-Car arm.
 """
 
-from .spiral_parameters import Sgr_Car
-from . import spiral_property as spiral_eq
+import numpy as np
+
+from .spiral_parameters import with_overrides
 from .spiral_arm_superclass import SpiralArm
 
 
 class SgrCarArm(SpiralArm):
-    def __init__(self):
-        super(SgrCarArm, self).__init__(Sgr_Car, 'purple', 51)
+    parameter_sets = ('Sgr_Car',)
+
+    def __init__(self, cache_dir=None, param_overrides=None,
+                 instrumentation=None, angular_step=1):
+        super(SgrCarArm, self).__init__(
+            with_overrides('Sgr_Car', param_overrides), 'purple', 51,
+            cache_dir, instrumentation, angular_step)
 
     def __repr__(self):
         return "SgrCar"
 
-    def _radii_factory(self, B):
-        if B <= self.params['B-kink']:
-            return self._spine_radius_at_B_and_psi(
-                B, self.params['B-kink'],
-                self.params['psi-before'],
-                self.params['R-kink'])
-        elif B > self.params['B-kink'] and B < self.params['l-tangency']:
-            return self._spine_radius_at_B_and_psi(
-                B, self.params['B-kink'],
-                self.params['psi-between'],
-                self.params['R-kink'])
-        else:
-            return self._spine_radius_at_B_and_psi(
-                B, self.params['B-kink'],
-                self.params['psi-after'],
-                self.params['R-kink']+0.6)
-
-    def _width_factory(self, B, r):
-        return spiral_eq.CylinderSize.width_kpc(
-            self.params['w-kink'], r, self.params['R-kink'])+0.25
+    def spine_radius(self, B):
+        B = np.asarray(B)
+        before_tangency = [
+            B <= self.params['B-kink'],
+            (B > self.params['B-kink']) & (B < self.params['l-tangency'])]
+        psi = np.select(before_tangency,
+                        [self.params['psi-before'],
+                         self.params['psi-between']],
+                        default=self.params['psi-after'])
+        R_kink = np.select(before_tangency,
+                           [self.params['R-kink'],
+                            self.params['R-kink']],
+                           default=self.params['R-kink']+0.6)
+        return self._spine_radius_at_B_and_psi(
+            B, self.params['B-kink'], psi, R_kink)
+
+    def width(self, B, r=None):
+        if r is None:
+            r = self.spine_radius(B)
+        return self._cylinder_width(self.params, r)+0.25
@@ -3,12 +3,15 @@ This module contains the superclass for all existing spiral arm classes.
 All spiral arms should inherit from this superclass.
 """
 
+from warnings import warn
+
 import numpy as np
 from shapely.geometry.polygon import Polygon  # TODO: use pygeos instead
-from descartes import PolygonPatch
-from scipy.signal import savgol_filter
 
-from .spiral_property import get_galactocentric_radius_at_B, polar_to_cartesian
+from ..instrumentation import timed
+from .geometry_cache import geometry_cache_key, load_geometry, save_geometry
+from .spiral_property import CylinderSize, WIDTH_SIGMA, \
+    get_galactocentric_radius_at_B, polar_to_cartesian
 
 
 class SpiralArm:
@@ -28,7 +31,24 @@ class SpiralArm:
         Matplotlib color for the spiral arm created
     tuning_window: int
         Length of the filter(smoothing in this case) window used to smooth the
-        spiral arm. See scipy.signal.salgov_filter for more info.
+        spiral arm, in degrees of azimuth (i.e. in samples at the default
+        angular_step). See scipy.signal.salgov_filter for more info.
+    cache_dir: str (optional)
+        Directory of the on-disk geometry cache (see geometry_cache.py).
+        If None (default), the geometry is always calculated.
+    instrumentation: Instrumentation (optional)
+        Records the wall time of each construction stage of the arm
+        (see instrumentation.py).
+    angular_step: Number
+        Azimuth step (deg) at which the spine is sampled, i.e. the angular
+        resolution of the arm; the arm polygon has about two vertices per
+        step. The azimuth range is divided evenly, so the actual step can
+        be slightly smaller if the range is not a multiple of it.
+
+    Subclasses take (cache_dir=None, param_overrides=None,
+    instrumentation=None, angular_step=1), where
+    param_overrides modifies their parameter dicts (listed in
+    parameter_sets), see spiral_parameters.with_overrides.
 
     Attributes
     ----------
@@ -36,12 +56,22 @@ class SpiralArm:
         store polypatch_color parameter
     self.tuning_window: int
         store tuning_window parameter
-    self.x_spine, self.y_spine: list, list
+    self.angular_step: Number
+        store angular_step parameter
+    self.x_spine, self.y_spine: numpy.ndarray, numpy.ndarray
         calculated spinal coordinates of the spiral arm
     self.polypatch: matplotlib.patches.PathPatch
         patch object to be plotted, along with self.x_spine and self.y_spine,
         onto matplotlib
         by: ax.add_patch(self.polypatch)
+        (only created on first access)
+
+    Methods
+    -------
+    spine_radius(B: array_like)
+        galactocentric radius (kpc) of the spine at the given azimuth(s)
+    width(B: array_like, r=None)
+        half-width (kpc) of the arm at the given azimuth(s)
 
     Returns
     -------
@@ -51,7 +81,7 @@ class SpiralArm:
 
     Note: for ThreeKpcArm in three_kpc.py, self.polypatch are split into
          _near and _far. Its self.x_spine and self.y_spine are also
-         lists-within-list, of len(2). I.e. while plotting, need to specify
+         lists of arrays, of len(2). I.e. while plotting, need to specify
 
          plt.plot(self.x_spine[0], self.y_spine[0])  # near-side
          plt.plot(self.x_spine[1], self.y_spine[1])  # far-side
@@ -59,103 +89,175 @@ class SpiralArm:
          separately.
     """
 
-    def __init__(self, spiral_params, polypatch_color, tuning_window):
+    # names of the parameter dicts (spiral_parameters.py) used by the arm
+    parameter_sets = ()
+
+    def __init__(self, spiral_params, polypatch_color, tuning_window,
+                 cache_dir=None, instrumentation=None, angular_step=1):
+        assert angular_step > 0
         self.params = spiral_params
         self._color = polypatch_color
         self.tuning_window = tuning_window
+        self.instrumentation = instrumentation
+        self.angular_step = angular_step
+        self._build_geometry(cache_dir)
+        with self._timed('polygon'):
+            self._polygon = Polygon(self._poly_coords)
+        self._polypatch = None
+
+    def __getstate__(self):
+        # matplotlib patches are recreated on demand after unpickling;
+        # the instrumentation (and its callback) stays with the original
+        return {name: (None if name.startswith('_polypatch')
+                       or name == 'instrumentation' else value)
+                for name, value in self.__dict__.items()}
+
+    def _timed(self, stage):
+        return timed(self.instrumentation, stage, repr(self))
+
+    def _make_polypatch(self, polygon):
+        # descartes (and with it matplotlib) is only imported once a patch
+        # is needed, so that classification-only use stays headless
+        from descartes import PolygonPatch
+        with self._timed('patch'):
+            return PolygonPatch(polygon, color=self._color, alpha=0.2)
+
+    @property
+    def polypatch(self):
+        if self._polypatch is None:
+            self._polypatch = self._make_polypatch(self._polygon)
+        return self._polypatch
+
+    def _timed_spine(self):
+        with self._timed('spine'):
+            return self.spine_radii_coords_b_range_and_width_with_smoothing()
+
+    def _compute_geometry(self):
         self._spine_r_kpc, self.x_spine, self.y_spine, self._B_spine, \
-            self._width_kpc = \
-            self.spine_radii_coords_b_range_and_width_with_smoothing()
-        self._poly_coords = self._poly_coords()
-        self._polygon = Polygon(self._poly_coords)
-        self.polypatch = PolygonPatch(self._polygon,
-                                      color=self._color,
-                                      alpha=0.2)
+            self._width_kpc = self._timed_spine()
+        return {'_spine_r_kpc': self._spine_r_kpc,
+                'x_spine': self.x_spine,
+                'y_spine': self.y_spine,
+                '_B_spine': self._B_spine,
+                '_width_kpc': self._width_kpc,
+                '_poly_coords': self._timed_poly_coords()}
+
+    def _timed_poly_coords(self):
+        with self._timed('borders'):
+            return self._poly_coords()
+
+    def _build_geometry(self, cache_dir=None):
+        # spines and polygon vertices are loaded from the on-disk cache if
+        # cache_dir is given and a matching entry exists
+        geometry = None
+        if cache_dir is not None:
+            key = geometry_cache_key(self)
+            with self._timed('cache_load'):
+                geometry = load_geometry(cache_dir, key)
+        if geometry is None:
+            geometry = self._compute_geometry()
+            if cache_dir is not None:
+                # the cache is only an optimisation; a read-only or full
+                # cache directory must not stop the arm from being built
+                try:
+                    save_geometry(cache_dir, key, geometry)
+                except OSError as error:
+                    warn("Could not cache the geometry of {} in {}: {}"
+                         .format(repr(self), cache_dir, error))
+        for name, value in geometry.items():
+            setattr(self, name, value)
 
     def _spine_radius_at_B_and_psi(self, B, B_kink, psi, R_kink):
         return get_galactocentric_radius_at_B(
             B, B_kink, psi, R_kink)
 
-    def _radii_factory(self, B):
+    def spine_radius(self, B):
+        """
+        Galactocentric radius (kpc) of the (unsmoothed) spine at the
+        azimuth(s) B (deg); B can be a number or an array.
+        """
         raise NotImplementedError()
 
-    def _width_factory(self, B, r):
+    def width(self, B, r=None):
+        """
+        Half-width (kpc) of the (unsmoothed) arm at the azimuth(s) B (deg),
+        where r is the spine radius at B (calculated if not given).
+        """
         raise NotImplementedError()
 
+    def _cylinder_width(self, params, r):
+        return CylinderSize.width_kpc(params['w-kink'], r, params['R-kink'],
+                                      params.get('sigma', WIDTH_SIGMA))
+
+    def _fine_tune_spine(self, B, r):
+        # hook for subclasses to adjust the smoothed spine radii before
+        # conversion to cartesian coordinates
+        return r
+
     def spine_radii_coords_b_range_and_width_with_smoothing(self):
-        r_spine = []
-        x_spine = []
-        y_spine = []
-        width_kpc = []
-
-        num_blist = (self.params['B-end']
-                     - self.params['B-begin']) + 1
-        B_list = np.linspace(
-                            self.params['B-begin'],
-                            self.params['B-end'],
-                            num_blist)
-        for B in B_list:
-            r = self._radii_factory(B)
-            w = self._width_factory(B, r)
-            r_spine.append(r)
-            width_kpc.append(w)
-        r_spine_moving_average = savgol_filter(r_spine, self.tuning_window, 1)
-        width_kpc_moving_average = savgol_filter(width_kpc,
-                                                 self.tuning_window, 1)
-        for B, r in zip(B_list, r_spine_moving_average):
-            cartesian_coords = polar_to_cartesian(r, B)
-            x_spine.append(cartesian_coords[0])
-            y_spine.append(cartesian_coords[1])
+        # scipy.signal is slow to import, and not needed at all when the
+        # geometry is loaded from the on-disk cache
+        from scipy.signal import savgol_filter
+        B_list = self._B_samples(self.params['B-begin'], self.params['B-end'])
+        num_blist = len(B_list)
+        r_spine = self.spine_radius(B_list)
+        width_kpc = self.width(B_list, r_spine)
+        window = self._smoothing_window(num_blist)
+        with self._timed('smoothing'):
+            r_spine_moving_average = savgol_filter(r_spine, window, 1)
+            width_kpc_moving_average = savgol_filter(width_kpc, window, 1)
+        x_spine, y_spine = polar_to_cartesian(
+            self._fine_tune_spine(B_list, r_spine_moving_average), B_list)
         return (r_spine_moving_average,
                 x_spine, y_spine, B_list, width_kpc_moving_average)
 
+    def _B_samples(self, B_begin, B_end, endpoint=True):
+        # evenly spaced azimuths (deg) from B_begin to B_end (excluded if
+        # not endpoint), as close to angular_step apart as the range allows
+        num_steps = max(1, int(round((B_end - B_begin) / self.angular_step)))
+        return np.linspace(B_begin, B_end, num_steps + endpoint,
+                           endpoint=endpoint)
+
+    def _smoothing_window(self, num_samples):
+        # the tuning window spans a fixed azimuth range, whatever the
+        # angular step; savgol_filter needs an odd number of samples, more
+        # than the polynomial order (1) and no more than num_samples
+        window = int(round(self.tuning_window / self.angular_step)) | 1
+        return max(3, min(window, num_samples - (num_samples % 2 == 0)))
+
     def _spine_normal_unit_vectors(self, x_spine, y_spine, B_list):
-        dx_list = np.diff(x_spine)
-        dy_list = np.diff(y_spine)
-        normal_inner_list = []
-        normal_outer_list = []
+        d_spine = np.column_stack((np.diff(x_spine), np.diff(y_spine)))
         theta = np.radians(90)
         c, s = np.cos(theta), np.sin(theta)
         rotation_matrix = np.array(((c, -s), (s, c)))
-        for dx, dy in zip(dx_list, dy_list):
-            normal_inner_vector = np.matmul(rotation_matrix, np.array(
-                                                                    [dx, dy]))
-            normal_inner_unit_vector = normal_inner_vector/np.linalg.norm(
-                                                        normal_inner_vector)
-            normal_outer_unit_vector = -normal_inner_unit_vector
-            normal_inner_list.append(normal_inner_unit_vector)
-            normal_outer_list.append(normal_outer_unit_vector)
-        return normal_inner_list, normal_outer_list
+        normal_inner_vectors = d_spine @ rotation_matrix.T
+        normal_inner_unit_vectors = normal_inner_vectors / np.linalg.norm(
+            normal_inner_vectors, axis=1)[:, np.newaxis]
+        return normal_inner_unit_vectors, -normal_inner_unit_vectors
 
     def _border_coords(self, x_spine, y_spine, b_list, width_kpc):
-        x_border_inner = []
-        y_border_inner = []
-        x_border_outer = []
-        y_border_outer = []
         normal_inner, normal_outer = self._spine_normal_unit_vectors(
             x_spine, y_spine, b_list)
-        for x, y, w, ni, no in zip(
-            x_spine[1:], y_spine[1:], width_kpc[1:], normal_inner, normal_outer
-                ):
-            vector_length = w
-            x_outer = x + (no[0] * vector_length)
-            y_outer = y + (no[1] * vector_length)
-            x_inner = x + (ni[0] * vector_length)
-            y_inner = y + (ni[1] * vector_length)
-            x_border_inner.append(x_inner)
-            y_border_inner.append(y_inner)
-            x_border_outer.append(x_outer)
-            y_border_outer.append(y_outer)
+        x = np.asarray(x_spine)[1:]
+        y = np.asarray(y_spine)[1:]
+        vector_length = np.asarray(width_kpc)[1:]
+        x_border_inner = x + (normal_inner[:, 0] * vector_length)
+        y_border_inner = y + (normal_inner[:, 1] * vector_length)
+        x_border_outer = x + (normal_outer[:, 0] * vector_length)
+        y_border_outer = y + (normal_outer[:, 1] * vector_length)
         return x_border_inner, y_border_inner, x_border_outer, y_border_outer
 
-    def _poly_coords(self):
+    def _poly_edge_coords(self, x_spine, y_spine, b_list, width_kpc):
         x_border_inner, y_border_inner, x_border_outer, y_border_outer = \
-            self._border_coords(self.x_spine,
-                                self.y_spine,
-                                self._B_spine,
-                                self._width_kpc)
-        x_poly_edge_coords = x_border_inner + x_border_outer[::-1]
-        y_poly_edge_coords = y_border_inner + y_border_outer[::-1]
-        poly_edge_coords = [xy for xy in zip(x_poly_edge_coords,
-                            y_poly_edge_coords)]
-        return poly_edge_coords
+            self._border_coords(x_spine, y_spine, b_list, width_kpc)
+        x_poly_edge_coords = np.concatenate((x_border_inner,
+                                             x_border_outer[::-1]))
+        y_poly_edge_coords = np.concatenate((y_border_inner,
+                                             y_border_outer[::-1]))
+        return np.column_stack((x_poly_edge_coords, y_poly_edge_coords))
+
+    def _poly_coords(self):
+        return self._poly_edge_coords(self.x_spine,
+                                      self.y_spine,
+                                      self._B_spine,
+                                      self._width_kpc)
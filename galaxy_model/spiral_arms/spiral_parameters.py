@@ -1,5 +1,7 @@
 """
 Modification of existing parameters in this file is NOT encouraged.
+Use with_overrides (e.g. through the param_overrides of the spiral arm
+classes) to get modified copies instead.
 """
 
 Sct_Cen = {'B-begin': 0, 'B-end': 430, 'R-kink': 4.91, 'B-kink': 67,
@@ -26,3 +28,44 @@ Perseus = {'B-begin': 188, 'B-end': 482, 'R-kink': 8.87, 'B-kink': 410,
 Three_Kpc = {'B-begin-near': 75, 'B-end-near': 225, 'B-begin-far': 260,
              'B-end-far': 400, 'R-kink': 3.25, 'B-kink': 75,
              'psi': 0.0, 'w-kink': 0.18}
+
+# names of the parameter dicts above, i.e. the valid keys of param_overrides
+PARAMETER_SETS = ('Sct_Cen', 'Norma', 'Outer', 'Local', 'Sgr_Car', 'Perseus',
+                  'Three_Kpc')
+
+
+def check_overrides(param_overrides):
+    """
+    Assert that all the parameter dict names of param_overrides (see
+    with_overrides) exist, e.g. to catch a misspelt {'Loacl': {...}} that
+    would otherwise be ignored by the arms.
+    """
+    unknown = [name for name in (param_overrides or {})
+               if name not in PARAMETER_SETS]
+    assert not unknown, "unknown parameter set(s) {}, expected any of {}" \
+        .format(unknown, list(PARAMETER_SETS))
+
+
+def with_overrides(name, param_overrides=None):
+    """
+    Parameters
+    ----------
+    name: str
+        name of a parameter dict of this module, e.g. 'Local'
+    param_overrides: dict (optional)
+        parameter dict name -> {parameter: value}, e.g.
+        {'Local': {'psi': -12}, 'Outer': {'w-kink': 0.7}}; names other
+        than the given one are ignored. Besides the parameters above,
+        'sigma' sets the width gradient factor (see
+        spiral_property.CylinderSize.width_kpc)
+
+    Returns
+    -------
+    copy of the parameter dict, updated with param_overrides[name]
+    """
+    params = dict(globals()[name])
+    overrides = (param_overrides or {}).get(name, {})
+    assert all(key in params or key == 'sigma' for key in overrides), \
+        "unknown parameter(s) for {}: {}".format(name, list(overrides))
+    params.update(overrides)
+    return params
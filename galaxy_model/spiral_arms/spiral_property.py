@@ -1,19 +1,29 @@
 import numpy as np
 
 
+# default factor of the width gradient, see CylinderSize.width_kpc; can be
+# overridden per arm by a 'sigma' spiral parameter
+WIDTH_SIGMA = 1.65
+
+# default number of scale heights (CylinderSize.height_kpc) above or below
+# the Galactic mid-plane counted as within an arm or spur; 2 covers about
+# 95% of a Gaussian vertical distribution with the scale height as its
+# standard deviation
+HEIGHT_SIGMA = 2
+
+
 class CylinderSize:
     @staticmethod
-    def width_kpc(w_kink, r, rkink, sigma=1.65):
+    def width_kpc(w_kink, r, rkink, sigma=WIDTH_SIGMA):
         w = w_kink + 0.042*(r-rkink)*sigma
         return w
 
     @staticmethod
     def height_kpc(r_galactocentric):
-        if r_galactocentric <= 7:
-            h = 0.02
-        else:
-            h = (20+(36*(r_galactocentric-7)))/1000
-        return h
+        # vectorized; works on scalars and arrays alike
+        h = np.where(np.asarray(r_galactocentric) <= 7, 0.02,
+                     (20+(36*(np.asarray(r_galactocentric)-7)))/1000)
+        return h[()]
 
 
 def get_galactocentric_radius_at_B(B, B_kink, psi, R_kink):
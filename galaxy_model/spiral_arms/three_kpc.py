@@ -3,80 +3,88 @@ This module use SpiralArm superclass, with some modifications,
  to create 3-kpc arm.
 """
 
+import numpy as np
 from shapely.geometry.polygon import Polygon
-from descartes import PolygonPatch
 
-from .spiral_parameters import Three_Kpc
+from .spiral_parameters import with_overrides
 from . import spiral_property as spiral_eq
 from .spiral_arm_superclass import SpiralArm
 
 
 class ThreeKpcArm(SpiralArm):
-    def __init__(self):
-        self.params = Three_Kpc
+    parameter_sets = ('Three_Kpc',)
+
+    def __init__(self, cache_dir=None, param_overrides=None,
+                 instrumentation=None, angular_step=1):
+        self.params = with_overrides('Three_Kpc', param_overrides)
         self._color = 'yellow'
         self.tuning_window = 3
+        self.instrumentation = instrumentation
+        self.angular_step = angular_step
+        self._build_geometry(cache_dir)
+        with self._timed('polygon'):
+            self._polygon_near = Polygon(self._poly_coords_inner)
+            self._polygon_far = Polygon(self._poly_coords_outer)
+        self._polypatch_near = None
+        self._polypatch_far = None
+
+    @property
+    def polypatch_near(self):
+        if self._polypatch_near is None:
+            self._polypatch_near = self._make_polypatch(self._polygon_near)
+        return self._polypatch_near
+
+    @property
+    def polypatch_far(self):
+        if self._polypatch_far is None:
+            self._polypatch_far = self._make_polypatch(self._polygon_far)
+        return self._polypatch_far
+
+    def _compute_geometry(self):
         self._spine_r_kpc, self.x_spine, self.y_spine, self._B_spine, \
-            self._width_kpc = \
-            self.spine_radii_coords_b_range_and_width_with_smoothing()
-        self._poly_coords_inner, self._poly_coords_outer = self._poly_coords()
-        self._polygon_near = Polygon(self._poly_coords_inner)
-        self._polygon_far = Polygon(self._poly_coords_outer)
-        self.polypatch_near = PolygonPatch(self._polygon_near,
-                                           color=self._color,
-                                           alpha=0.2)
-        self.polypatch_far = PolygonPatch(self._polygon_far,
-                                          color=self._color,
-                                          alpha=0.2)
+            self._width_kpc = self._timed_spine()
+        poly_coords_inner, poly_coords_outer = self._timed_poly_coords()
+        return {'_spine_r_kpc': self._spine_r_kpc,
+                'x_spine': self.x_spine,
+                'y_spine': self.y_spine,
+                '_B_spine': self._B_spine,
+                '_width_kpc': self._width_kpc,
+                '_poly_coords_inner': poly_coords_inner,
+                '_poly_coords_outer': poly_coords_outer}
 
     def __repr__(self):
         return "ThreeKpc"
 
-    def _radii_factory(self, B):
+    def spine_radius(self, B):
         return self._spine_radius_at_B_and_psi(
-            B, self.params['B-kink'],
+            np.asarray(B), self.params['B-kink'],
             self.params['psi'],
             self.params['R-kink'])
 
-    def _width_factory(self, B, r):
-        return spiral_eq.CylinderSize.width_kpc(
-            self.params['w-kink'], r, self.params['R-kink']) + 0.1
+    def width(self, B, r=None):
+        if r is None:
+            r = self.spine_radius(B)
+        return self._cylinder_width(self.params, r) + 0.1
 
     def spine_radii_coords_b_range_and_width_with_smoothing(self):
-        r_spine_near = []
-        x_spine_near = []
-        y_spine_near = []
-        width_kpc_near = []
-        B_list_near = [x for x in range(self.params['B-begin-near'],
-                                        self.params['B-end-near'])]
-        r_spine_far = []
-        x_spine_far = []
-        y_spine_far = []
-        width_kpc_far = []
-        B_list_far = [x for x in range(self.params['B-begin-far'],
-                                       self.params['B-end-far'])]
-
-        for B_near in B_list_near:
-            r_near = self._radii_factory(B_near)
-            w_near = self._width_factory(B_near, r_near)
-            r_spine_near.append(r_near)
-            width_kpc_near.append(w_near)
-
-        for B_far in B_list_far:
-            r_far = self._radii_factory(B_far)
-            w_far = self._width_factory(B_far, r_far)
-            r_spine_far.append(r_far)
-            width_kpc_far.append(w_far)
-
-        for B_near, r_near in zip(B_list_near, r_spine_near):
-            cartesian_coords = spiral_eq.polar_to_cartesian(r_near, B_near)
-            x_spine_near.append(cartesian_coords[0])
-            y_spine_near.append(cartesian_coords[1])
-
-        for B_far, r_far in zip(B_list_far, r_spine_far):
-            cartesian_coords = spiral_eq.polar_to_cartesian(r_far, B_far)
-            x_spine_far.append(cartesian_coords[0])
-            y_spine_far.append(cartesian_coords[1])
+        # the end of each part is not sampled (as with the original
+        # 1 deg steps)
+        B_list_near = self._B_samples(self.params['B-begin-near'],
+                                      self.params['B-end-near'],
+                                      endpoint=False)
+        B_list_far = self._B_samples(self.params['B-begin-far'],
+                                     self.params['B-end-far'],
+                                     endpoint=False)
+
+        r_spine_near = self.spine_radius(B_list_near)
+        width_kpc_near = self.width(B_list_near, r_spine_near)
+        r_spine_far = self.spine_radius(B_list_far)
+        width_kpc_far = self.width(B_list_far, r_spine_far)
+
+        x_spine_near, y_spine_near = spiral_eq.polar_to_cartesian(
+            r_spine_near, B_list_near)
+        x_spine_far, y_spine_far = spiral_eq.polar_to_cartesian(
+            r_spine_far, B_list_far)
 
         r_spine = [r_spine_near, r_spine_far]
         x_spine = [x_spine_near, x_spine_far]
@@ -86,29 +94,12 @@ class ThreeKpcArm(SpiralArm):
         return (r_spine, x_spine, y_spine, B_list, width_kpc)
 
     def _poly_coords(self):
-        x_border_inner_near, y_border_inner_near, x_border_outer_near, \
-            y_border_outer_near = \
-            self._border_coords(self.x_spine[0],
-                                self.y_spine[0],
-                                self._B_spine[0],
-                                self._width_kpc[0])
-        x_border_inner_far, y_border_inner_far, x_border_outer_far, \
-            y_border_outer_far = \
-            self._border_coords(self.x_spine[1],
-                                self.y_spine[1],
-                                self._B_spine[1],
-                                self._width_kpc[1])
-
-        x_poly_edge_coords_near = x_border_inner_near \
-            + x_border_outer_near[::-1]
-        y_poly_edge_coords_near = y_border_inner_near \
-            + y_border_outer_near[::-1]
-        poly_edge_coords_near = [xy for xy in zip(x_poly_edge_coords_near,
-                                 y_poly_edge_coords_near)]
-
-        x_poly_edge_coords_far = x_border_inner_far + x_border_outer_far[::-1]
-        y_poly_edge_coords_far = y_border_inner_far + y_border_outer_far[::-1]
-        poly_edge_coords_far = [xy for xy in zip(x_poly_edge_coords_far,
-                                y_poly_edge_coords_far)]
-
+        poly_edge_coords_near = self._poly_edge_coords(self.x_spine[0],
+                                                       self.y_spine[0],
+                                                       self._B_spine[0],
+                                                       self._width_kpc[0])
+        poly_edge_coords_far = self._poly_edge_coords(self.x_spine[1],
+                                                      self.y_spine[1],
+                                                      self._B_spine[1],
+                                                      self._width_kpc[1])
         return poly_edge_coords_near, poly_edge_coords_far
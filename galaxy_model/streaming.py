@@ -0,0 +1,211 @@
+"""
+This module classifies catalogue files chunk by chunk, so that the memory
+use stays bounded no matter how big the catalogue is.
+
+Supported files are CSV (with a header line naming the columns) and .npy
+(2D arrays, columns selected by index and defaulting to the first ones, or
+structured arrays, columns selected by field name; read memory-mapped).
+The columns are either cartesian x/y (kpc) or heliocentric l/b/d (deg, deg,
+kpc), see coordinates.py.
+
+Results can also be written straight into (memory-mapped) output arrays,
+see classify_arrays and classify_npy_file.
+"""
+
+from itertools import islice
+
+import numpy as np
+
+from .coordinates import heliocentric_to_galactocentric
+
+_DEFAULT_COLUMNS = {'xy': ('x', 'y'), 'lbd': ('l', 'b', 'd')}
+
+
+def _npy_columns(path, columns):
+    # memory-mapped views of the columns; nothing is read yet
+    data = np.load(path, mmap_mode='r')
+    if data.dtype.names is not None:
+        return tuple(data[name] for name in columns)
+    if any(isinstance(column, str) for column in columns):
+        if tuple(columns) not in _DEFAULT_COLUMNS.values():
+            raise ValueError(
+                "{} is a plain array without column names; select the "
+                "columns {} by index, e.g. columns={}".format(
+                    path, tuple(columns), tuple(range(len(columns)))))
+        # the default columns of a plain array are the first ones
+        columns = range(len(columns))
+    return tuple(data[:, index] for index in columns)
+
+
+def _read_npy_chunks(path, columns, chunk_size):
+    data_columns = _npy_columns(path, columns)
+    for start in range(0, len(data_columns[0]), chunk_size):
+        yield tuple(np.asarray(column[start:start+chunk_size], dtype=float)
+                    for column in data_columns)
+
+
+def _read_csv_chunks(path, columns, chunk_size, delimiter):
+    with open(path) as f:
+        # names may be padded with spaces and quoted, e.g. "x", "y"
+        header = [name.strip().strip('"\'').strip()
+                  for name in f.readline().split(delimiter)]
+        usecols = [column if isinstance(column, int)
+                   else header.index(column) for column in columns]
+        while True:
+            lines = list(islice(f, chunk_size))
+            if len(lines) == 0:
+                return
+            chunk = np.loadtxt(lines, delimiter=delimiter, usecols=usecols,
+                               ndmin=2)
+            yield tuple(chunk[:, i] for i in range(len(columns)))
+
+
+def read_chunks(path, columns=('x', 'y'), chunk_size=1000000, delimiter=','):
+    """
+    Read the given columns of a CSV or .npy file in chunks.
+
+    Parameters
+    ----------
+    path: str
+        CSV file (first line is the header) or .npy file
+    columns: tuple
+        column names (CSV header or .npy field names) or indices; the
+        default names select the first columns of a plain 2D .npy array
+    chunk_size: int
+        number of rows per chunk
+    delimiter: str
+        CSV delimiter
+
+    Yields
+    ------
+    tuple of numpy.ndarray, one per column, of (at most) chunk_size rows
+    """
+    assert chunk_size > 0
+    if str(path).endswith('.npy'):
+        return _read_npy_chunks(path, columns, chunk_size)
+    return _read_csv_chunks(path, columns, chunk_size, delimiter)
+
+
+def classify_file(galaxy, path, coords='xy', columns=None, chunk_size=1000000,
+                  delimiter=',', use_lookup_grid=False):
+    """
+    Classify the coordinates of a catalogue file chunk by chunk.
+
+    Parameters
+    ----------
+    galaxy: Galaxy
+    path: str
+        CSV or .npy file, see read_chunks
+    coords: str
+        'xy' for cartesian (kpc) columns, or 'lbd' for heliocentric
+        Galactic longitude, latitude (deg) and distance (kpc) columns
+    columns: tuple (optional)
+        column names or indices; defaults to ('x', 'y') or ('l', 'b', 'd'),
+        i.e. the first 2 or 3 columns of a plain 2D .npy array
+    chunk_size: int
+        number of rows classified at once
+    delimiter: str
+        CSV delimiter
+    use_lookup_grid: bool
+        see Galaxy.isOnSpiralArmOrSpurBatch
+
+    Yields
+    ------
+    numpy.ndarray of int per chunk, encoding the locations the same way as
+    Galaxy.isOnSpiralArmOrSpur
+    """
+    columns = _columns_for(coords, columns)
+    for chunk in read_chunks(path, columns, chunk_size, delimiter):
+        x, y = _to_xy(chunk, coords)
+        yield galaxy.isOnSpiralArmOrSpurBatch(
+            x, y, use_lookup_grid=use_lookup_grid)
+
+
+def _columns_for(coords, columns):
+    assert coords in _DEFAULT_COLUMNS
+    if columns is None:
+        columns = _DEFAULT_COLUMNS[coords]
+    assert len(columns) == len(_DEFAULT_COLUMNS[coords])
+    return columns
+
+
+def _to_xy(chunk, coords):
+    if coords == 'lbd':
+        x, y, _ = heliocentric_to_galactocentric(*chunk)
+        return x, y
+    return chunk
+
+
+def classify_arrays(galaxy, *coord_arrays, coords='xy', out=None,
+                    chunk_size=1000000, use_lookup_grid=False):
+    """
+    Classify (1D) coordinate arrays chunk by chunk, writing the results into
+    out. Meant for numpy.memmap inputs and outputs: only one chunk of the
+    coordinates is in memory at a time, and nothing is copied into lists.
+
+    Parameters
+    ----------
+    galaxy: Galaxy
+    coord_arrays: array_like
+        x, y (kpc) arrays if coords is 'xy', or l, b (deg), d (kpc) arrays
+        if coords is 'lbd'
+    coords: str
+        'xy' or 'lbd'
+    out: numpy.ndarray (optional)
+        integer array (e.g. numpy.memmap) of the same length as the
+        coordinates; a new int8 array is created if None
+    chunk_size: int
+        number of coordinates classified at once
+    use_lookup_grid: bool
+        see Galaxy.isOnSpiralArmOrSpurBatch
+
+    Returns
+    -------
+    out, encoding the locations the same way as Galaxy.isOnSpiralArmOrSpur
+    """
+    assert chunk_size > 0
+    assert len(coord_arrays) == len(_DEFAULT_COLUMNS[coords])
+    num_coords = len(coord_arrays[0])
+    assert all(len(array) == num_coords for array in coord_arrays)
+    if out is None:
+        out = np.empty(num_coords, dtype=np.int8)
+    assert len(out) == num_coords
+
+    for start in range(0, num_coords, chunk_size):
+        chunk = tuple(np.asarray(array[start:start+chunk_size], dtype=float)
+                      for array in coord_arrays)
+        x, y = _to_xy(chunk, coords)
+        out[start:start+chunk_size] = galaxy.isOnSpiralArmOrSpurBatch(
+            x, y, use_lookup_grid=use_lookup_grid)
+    return out
+
+
+def classify_npy_file(galaxy, path, out_path, coords='xy', columns=None,
+                      chunk_size=1000000, use_lookup_grid=False):
+    """
+    Classify the coordinates of a .npy file (possibly larger than memory),
+    writing the results into a memory-mapped int8 .npy file.
+
+    Parameters
+    ----------
+    galaxy: Galaxy
+    path: str
+        input .npy file, read memory-mapped; several processes can share
+        it through the page cache
+    out_path: str
+        output .npy file, created (or overwritten)
+    coords, columns, chunk_size, use_lookup_grid:
+        see classify_file
+
+    Returns
+    -------
+    numpy.memmap of the output file
+    """
+    columns = _columns_for(coords, columns)
+    data_columns = _npy_columns(path, columns)
+    out = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.int8,
+                                    shape=(len(data_columns[0]),))
+    classify_arrays(galaxy, *data_columns, coords=coords, out=out,
+                    chunk_size=chunk_size, use_lookup_grid=use_lookup_grid)
+    out.flush()
+    return out
@@ -0,0 +1,83 @@
+"""
+This module contains the parameter sweep used by Galaxy.sweepParameters:
+the same coordinates are classified for a number of variants of the spiral
+parameters (see spiral_arms/spiral_parameters.py).
+
+A spiral arm only depends on its own parameter dicts (its parameter_sets),
+so each distinct arm is built, and tested against the coordinates, only
+once over all the variants. Arms whose parameters a variant does not change
+are reused as they are, including the arms of the Galaxy itself.
+"""
+
+import numpy as np
+
+from .spiral_arms.spiral_parameters import check_overrides
+
+
+def _arm_key(arm_class, param_overrides):
+    # identifies the geometry of an arm: its class and the overrides of
+    # its own parameter dicts
+    param_overrides = param_overrides or {}
+    return (arm_class, tuple(
+        (name, tuple(sorted(param_overrides[name].items())))
+        for name in arm_class.parameter_sets if param_overrides.get(name)))
+
+
+def sweep_parameters(galaxy, variants, x_coord, y_coord,
+                     geometry_cache_dir=None):
+    """
+    Parameters
+    ----------
+    galaxy: Galaxy
+    variants: sequence of dict
+        param_overrides of each variant (see Galaxy), e.g.
+        [{'Local': {'psi': -10}}, {'Local': {'psi': -12}}, {}]
+    x_coord, y_coord: array_like of numericals (same shape)
+    geometry_cache_dir: str (optional)
+        see Galaxy; applies to the arms built for the variants
+
+    Returns
+    -------
+    numpy.ndarray of int8, of shape (len(variants), number of coordinates),
+    encoding the locations of the (flattened) coordinates for each variant
+    the same way as Galaxy.isOnSpiralArmOrSpur
+    """
+    x = np.asarray(x_coord, dtype=float).ravel()
+    y = np.asarray(y_coord, dtype=float).ravel()
+    assert x.shape == y.shape
+    for param_overrides in variants:
+        check_overrides(param_overrides)
+
+    # arm key -> arm object, starting with the arms of the galaxy itself
+    arms = {_arm_key(type(arm_obj), galaxy.param_overrides): arm_obj
+            for arm_obj in galaxy.spiral_arms}
+    # arm key -> coordinates within the arm
+    arm_contains = {}
+
+    def contains_arm(arm_class, param_overrides):
+        key = _arm_key(arm_class, param_overrides)
+        if key not in arm_contains:
+            if key not in arms:
+                arms[key] = arm_class(
+                    cache_dir=geometry_cache_dir,
+                    param_overrides=param_overrides,
+                    instrumentation=galaxy.instrumentation,
+                    angular_step=galaxy.angular_step)
+            arm_contains[key] = galaxy._contains(
+                galaxy._arm_geometry(arms[key]), x, y)
+        return arm_contains[key]
+
+    # the spurs and the bar are the same for all variants
+    num_arms = len(galaxy.spiral_arms)
+    fixed_bitmask = np.zeros(x.shape, dtype=np.uint16)
+    for bit, geom in enumerate(galaxy._geometries()[num_arms:], num_arms):
+        fixed_bitmask[galaxy._contains(geom, x, y)] |= np.uint16(1 << bit)
+
+    results = np.empty((len(variants), len(x)), dtype=np.int8)
+    for i, param_overrides in enumerate(variants):
+        bitmask = fixed_bitmask.copy()
+        for bit, arm_obj in enumerate(galaxy.spiral_arms):
+            bitmask[contains_arm(type(arm_obj), param_overrides)] |= \
+                np.uint16(1 << bit)
+        results[i] = galaxy._bitmask_to_location_encoding(bitmask)
+    return results
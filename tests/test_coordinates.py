@@ -0,0 +1,119 @@
+import os
+import sys
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                '..')))
+
+from galaxy_model.galaxy import Galaxy # noqa
+from galaxy_model.coordinates import heliocentric_to_galactocentric # noqa
+
+gal = Galaxy()
+
+
+def test_sun_and_galactic_centre():
+    # the Sun is at (0, ~solar_dist), the Galactic Centre at (0, 0)
+    x, y, z = heliocentric_to_galactocentric(0, 0, 0, solar_dist=8.0)
+    assert np.allclose([x, y, z], [0, 8.0, 0.0055], atol=1e-5)
+    x, y, z = heliocentric_to_galactocentric(0, 0, 8.15)
+    assert np.allclose([x, y, z], 0, atol=1e-4)
+    print("Test sun_and_galactic_centre passed!")
+
+
+def test_against_astropy():
+    try:
+        import astropy.coordinates as coord
+        import astropy.units as u
+    except ImportError:
+        print("astropy not installed; test_against_astropy skipped")
+        return
+    rng = np.random.default_rng(6)
+    glon = rng.uniform(0, 360, 1000)
+    glat = rng.uniform(-30, 30, 1000)
+    dist = rng.uniform(0.1, 20, 1000)
+    c_galacto = coord.SkyCoord(
+        l=glon*u.degree, b=glat*u.degree, distance=dist*u.kpc,
+        frame='galactic').transform_to(coord.Galactocentric(
+            galcen_distance=8.15*u.kpc, z_sun=5.5*u.pc,
+            galcen_coord=coord.SkyCoord(ra=266.4051*u.degree,
+                                        dec=-28.936175*u.degree),
+            roll=0*u.degree))
+    x, y, z = heliocentric_to_galactocentric(glon, glat, dist)
+    # agrees to within a parsec-fraction (frame bias of ICRS vs FK5)
+    assert np.allclose(x, c_galacto.y.value, atol=1e-4)
+    assert np.allclose(y, -c_galacto.x.value, atol=1e-4)
+    assert np.allclose(z, c_galacto.z.value, atol=1e-4)
+    print("Test against_astropy passed!")
+
+
+def test_on_anything_lbd():
+    rng = np.random.default_rng(7)
+    glon = rng.uniform(0, 360, 5000)
+    glat = rng.uniform(-1, 1, 5000)
+    dist = rng.uniform(0.1, 15, 5000)
+    x, y, _ = heliocentric_to_galactocentric(glon, glat, dist)
+    assert np.array_equal(gal.isOnSpiralArmOrSpurLBD(glon, glat, dist),
+                          gal.isOnSpiralArmOrSpurBatch(x, y))
+    print("Test on_anything_lbd passed!")
+
+
+def test_membership_probabilities():
+    rng = np.random.default_rng(8)
+    glon = rng.uniform(0, 360, 300)
+    glat = rng.uniform(-1, 1, 300)
+    dist = rng.uniform(0.1, 15, 300)
+    # without uncertainty, the probabilities are the exact locations
+    exact = gal.membershipProbabilities(glon, glat, dist, 0, num_samples=3)
+    x, y, _ = heliocentric_to_galactocentric(glon, glat, dist)
+    bitmask = gal._location_bitmask(x, y)
+    for bit, probability in enumerate(exact.values()):
+        assert np.array_equal(probability, (bitmask >> bit) & 1)
+    # the results do not depend on the chunking
+    uncertain = gal.membershipProbabilities(glon, glat, dist, 0.3*dist,
+                                            num_samples=200, seed=9)
+    chunked = gal.membershipProbabilities(glon, glat, dist, 0.3*dist,
+                                          num_samples=200, chunk_size=1000,
+                                          seed=9, use_lookup_grid=True)
+    for name in uncertain:
+        assert np.array_equal(uncertain[name], chunked[name])
+        assert ((uncertain[name] >= 0) & (uncertain[name] <= 1)).all()
+    print("Test membership_probabilities passed!")
+
+
+def test_on_anything_3d():
+    rng = np.random.default_rng(10)
+    x = rng.uniform(-16, 16, 5000)
+    y = rng.uniform(-16, 16, 5000)
+    z = rng.normal(0, 0.1, 5000)
+    on_anything_2d = gal.isOnSpiralArmOrSpurBatch(x, y)
+    assert np.array_equal(gal.isOnSpiralArmOrSpur3D(x, y, np.zeros(5000)),
+                          on_anything_2d)
+    on_anything_3d = gal.isOnSpiralArmOrSpur3D(x, y, z)
+    r = np.hypot(x, y)
+    scale_height = np.where(r <= 7, 0.02, 0.02 + 0.036*(r-7))
+    within_height = np.abs(z) <= 2*scale_height
+    assert np.array_equal(on_anything_3d[within_height],
+                          on_anything_2d[within_height])
+    assert (on_anything_3d[~within_height] == 0).all()
+    # the bar has no height cut
+    bar = gal.location_names.index('Bar')
+    bar_2d = gal.locationMatrix(x, y)[:, bar]
+    assert (bar_2d & ~within_height).any()
+    assert np.array_equal(gal.locationMatrix(x, y, z)[:, bar], bar_2d)
+    # towards the Galactic Centre, 0.4 kpc above the plane: in the bar only
+    above_centre = gal.membershipProbabilities([0], [3], [8.15], 0,
+                                               num_samples=1,
+                                               check_height=True)
+    assert [name for name, p in above_centre.items() if p[0] == 1] == ['Bar']
+    # a high-latitude source above the Perseus arm
+    assert gal.isOnSpiralArmOrSpurLBD([140], [0], [2]).tolist() == [1]
+    assert gal.isOnSpiralArmOrSpurLBD([140], [30], [2],
+                                      check_height=True).tolist() == [0]
+    print("Test on_anything_3d passed!")
+
+
+if __name__ == "__main__":
+    test_sun_and_galactic_centre()
+    test_against_astropy()
+    test_on_anything_lbd()
+    test_membership_probabilities()
+    test_on_anything_3d()
@@ -1,10 +1,19 @@
 import os
+import pickle
+import subprocess
 import sys
+import tempfile
+import threading
+import warnings
+import numpy as np
 import matplotlib.pyplot as plt
+from shapely.geometry import LineString, Point
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
                                                 '..')))
 
-from galaxy_model.galaxy import Galaxy # noqa
+from galaxy_model.arm_coordinates import ArmCoordinateIndex # noqa
+from galaxy_model.galaxy import BACKGROUND_CACHE_SIZE, Galaxy # noqa
+from galaxy_model.instrumentation import Instrumentation # noqa
 
 gal = Galaxy()
 
@@ -22,12 +31,152 @@ def test_add_and_remove_coords():
     print("Test add_and_remove_coord passed!")
 
 
+def test_add_and_remove_coords_bulk():
+    gal_bulk = Galaxy()
+    x = np.arange(100000, dtype=float)
+    gal_bulk.add_coord(x, -x)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        gal_bulk.remove_coord(np.append(x[::2], [-1, -2]),
+                              np.append(-x[::2], [1, 2]))
+    assert len(caught) == 1
+    assert "2 coordinate(s)" in str(caught[0].message)
+    assert gal_bulk.src_x_coords == x[1::2].tolist()
+    assert gal_bulk.src_y_coords == (-x[1::2]).tolist()
+    # only the earliest added one of identical coordinates is removed
+    gal_bulk.add_coord([1], [-1])
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        gal_bulk.remove_coord([1], [-1])
+    assert len(caught) == 1
+    assert gal_bulk.src_x_coords == x[3::2].tolist() + [1]
+    # the returned coordinates are not changed by later removals (which
+    # compact the store), and changing them does not change the store
+    src_x_coords = gal_bulk.src_x_coords
+    src_x_array = gal_bulk._sources.x
+    gal_bulk.remove_coord(x[3:60001:2], -x[3:60001:2])
+    assert src_x_coords == x[3::2].tolist() + [1]
+    assert src_x_array.tolist() == src_x_coords
+    assert not src_x_array.flags.writeable
+    src_x_coords[0] = 5
+    assert gal_bulk.src_x_coords == x[60001::2].tolist() + [1]
+    print("Test add_and_remove_coords_bulk passed!")
+
+
 def test_plot_galaxy_basic():
     gal.add_coord([0.5], [10])
     gal.plot()
     plt.show()
 
 
+def test_plot_galaxy_density():
+    gal_density = Galaxy()
+    rng = np.random.default_rng(4)
+    gal_density.add_coord(rng.normal(0, 5, 100000), rng.normal(0, 5, 100000))
+    gal_density.plot(plotSrc=True, srcMode='density', densityBins=256)
+    plt.show()
+
+
+def test_plot_galaxy_cached_background():
+    gal.add_coord([0.5], [10])
+    gal.plot(plotSrc=True, cacheBackground=True)
+    gal.plot(plotSrc=True, cacheBackground=True)
+    assert len(gal._background_cache) == 1
+    gal.plot(x_radius=10, y_radius=10, cacheBackground=True)
+    assert len(gal._background_cache) == 2
+    # only the most recently used rasters are kept
+    for radius in range(11, 11 + BACKGROUND_CACHE_SIZE):
+        gal.plot(x_radius=radius, y_radius=radius, cacheBackground=True)
+    assert len(gal._background_cache) == BACKGROUND_CACHE_SIZE
+    assert all(key[0] >= 11 for key in gal._background_cache)
+    plt.show()
+
+
+def test_plot_galaxy_interactive():
+    gal_interactive = Galaxy()
+    rng = np.random.default_rng(5)
+    gal_interactive.add_coord(rng.uniform(-16, 16, 200000),
+                              rng.uniform(-16, 16, 200000))
+    gal_interactive.plot(plotSrc=True, isInteractive=True, maxPoints=10000)
+    view = gal_interactive._interactive_view
+    assert view.num_shown == 10000
+    assert view.tolerance > 0
+    # zoom in; all sources within the view are shown, at full detail. The
+    # view is refreshed once per zoom, when it is drawn
+    refresh, refreshed = view._refresh, []
+
+    def counted_refresh():
+        refreshed.append(view.ax.get_xlim() + view.ax.get_ylim())
+        refresh()
+    view._refresh = counted_refresh
+    view.ax.set_xlim(-0.5, 0.5)
+    view.ax.set_ylim(-0.5, 0.5)
+    assert refreshed == []
+    view.ax.figure.canvas.draw()
+    assert refreshed == [(-0.5, 0.5, -0.5, 0.5)]
+    assert view.num_shown == view.num_in_view
+    assert view.num_in_view < 10000
+    assert view.tolerance == 0
+    view.ax.figure.canvas.draw()
+    assert len(refreshed) == 1
+    # without plotSrc, no sources are drawn
+    gal_interactive.plot(isInteractive=True, plotSrc=False)
+    assert gal_interactive._interactive_view.num_in_view == 0
+    plt.show()
+
+
+# spine radii and half-widths (kpc) at 5 azimuths over the range of each arm,
+# and the number of vertices, vertex sum and sum of squares of the polygon,
+# as computed by the original (per-azimuth) implementation
+ARM_BASELINE = {
+    'Local': ([7.406288, 7.897567, 8.421435, 8.980051, 9.575723],
+              [0.450838, 0.484883, 0.521187, 0.5599, 0.60118],
+              146, [28.091377, 1153.176005], 10545.980281),
+    'ThreeKpc': ([3.25, 3.25, 3.25, 3.25, 3.25],
+                 [0.28, 0.28, 0.28, 0.28, 0.28],
+                 576, [-17.389778, 10.039993], 6129.1584),
+    'SgrCar': ([3.762424, 4.734331, 5.9573, 8.999607, 12.436785],
+               [0.362164, 0.429517, 0.514269, 0.725101, 0.963297],
+               800, [-1159.303322, -355.349259], 44066.93082),
+    'SctCen': ([3.788729, 5.933867, 8.382998, 11.635251, 16.727305],
+               [0.352296, 0.500954, 0.670679, 0.89606, 1.248939],
+               860, [1710.282536, 126.470229], 81380.819653),
+    'Perseus': ([3.626057, 4.875913, 6.556579, 8.81655, 11.145596],
+                [0.286595, 0.37321, 0.48968, 0.646296, 0.807699],
+                588, [1085.935405, 523.552075], 30902.216514),
+    'NormaOuter': ([4.755402, 5.544913, 5.902328, 9.08456, 15.392224],
+                   [0.360471, 0.415184, 0.439953, 0.631328, 1.068449],
+                   902, [1020.222614, 1434.817355], 56690.018176)}
+
+
+def test_spine_radius_and_width_vectorized():
+    B_array = np.arange(-150, 500, 0.5)
+    for arm in gal.spiral_arms:
+        r_array = arm.spine_radius(B_array)
+        w_array = arm.width(B_array)
+        assert r_array.shape == B_array.shape
+        assert np.allclose(r_array, [arm.spine_radius(B) for B in B_array])
+        assert np.allclose(w_array, [arm.width(B) for B in B_array])
+        # regression against the frozen baseline
+        radii, widths, num_coords, coords_sum, coords_sum_sq = \
+            ARM_BASELINE[repr(arm)]
+        B_begin = arm.params.get('B-begin', arm.params.get('B-begin-near'))
+        B_end = arm.params.get('B-end', arm.params.get('B-end-far'))
+        B_samples = np.linspace(B_begin, B_end, 5)
+        assert np.allclose(arm.spine_radius(B_samples), radii, atol=1e-6)
+        assert np.allclose(arm.width(B_samples), widths, atol=1e-6)
+        # ThreeKpc arm has two (near/far) parts
+        if repr(arm) == "ThreeKpc":
+            coords = np.concatenate((arm._poly_coords_inner,
+                                     arm._poly_coords_outer))
+        else:
+            coords = np.asarray(arm._poly_coords)
+        assert len(coords) == num_coords
+        assert np.allclose(coords.sum(axis=0), coords_sum, atol=1e-5)
+        assert np.isclose((coords**2).sum(), coords_sum_sq, atol=1e-5)
+    print("Test spine_radius_and_width_vectorized passed!")
+
+
 def test_on_spur():
     assert gal._on_spur(0.5, 10) is False
     assert gal._on_spur(1.54, 4.35) is True
@@ -48,9 +197,303 @@ def test_on_anything():
     print("Test on_anything passed!")
 
 
+def test_on_anything_batch():
+    x = [6.5, 0.5, -2.27, 1.54]
+    y = [1, 10, 4.62, 4.35]
+    assert gal.isOnSpiralArmOrSpurBatch(x, y).tolist() == [0, 1, 2, 3]
+    rng = np.random.default_rng(0)
+    x_rand = rng.uniform(-16, 16, 200)
+    y_rand = rng.uniform(-16, 16, 200)
+    assert gal.isOnSpiralArmOrSpurBatch(x_rand, y_rand).tolist() == \
+        gal.isOnSpiralArmOrSpur(list(x_rand), list(y_rand))
+    print("Test on_anything_batch passed!")
+
+
+def test_on_bar():
+    # bar: centre, along the major axis (60 deg) and across it
+    x = [0, 4.4*np.cos(np.pi/3), 4.6*np.cos(np.pi/3), -1.7*np.sin(np.pi/3)]
+    y = [0, 4.4*np.sin(np.pi/3), 4.6*np.sin(np.pi/3), 1.7*np.cos(np.pi/3)]
+    assert gal.isOnBar(x, y).tolist() == [True, True, False, False]
+    assert gal.locationMatrix(x, y)[:, gal.location_names.index('Bar')] \
+        .tolist() == [True, True, False, False]
+    assert gal.decodeLocationBitmask(gal.locationBitmask([0], [0])[0]) == \
+        ['Bar']
+    # the bar is not part of the location encoding
+    assert gal.isOnSpiralArmOrSpurBatch([0], [0]).tolist() == [0]
+    # the spurs are exact circles
+    spur = gal.spurs[0]
+    angles = np.linspace(0, 2*np.pi, 100)
+    for radius, inside in ((spur.radius - 1e-6, True),
+                           (spur.radius + 1e-6, False)):
+        x_circle = spur.x + radius*np.cos(angles)
+        y_circle = spur.y + radius*np.sin(angles)
+        spur_bits = gal.locationMatrix(x_circle, y_circle)[
+            :, gal.location_names.index('Spur0')]
+        assert (spur_bits == inside).all()
+    print("Test on_bar passed!")
+
+
+def test_location_bitmask():
+    x = [6.5, 0.5, -2.27, 1.54]
+    y = [1, 10, 4.62, 4.35]
+    bitmask = gal.locationBitmask(x, y)
+    assert bitmask.dtype == np.uint16
+    assert [gal.decodeLocationBitmask(value) for value in bitmask] == \
+        [[], ['Perseus'], ['Spur0'], ['NormaOuter', 'SctCen', 'Spur1']]
+    matrix = gal.locationMatrix(x, y)
+    assert matrix.shape == (4, len(gal.location_names))
+    assert matrix[3].tolist() == [name in ('NormaOuter', 'SctCen', 'Spur1')
+                                  for name in gal.location_names]
+    assert np.array_equal(gal._bitmask_to_location_encoding(bitmask),
+                          gal.isOnSpiralArmOrSpurBatch(x, y))
+    assert (gal.locationBitmask(x, y, z_coord=[1, 1, 1, 1]) == 0).all()
+    print("Test location_bitmask passed!")
+
+
+def test_on_anything_lookup_grid():
+    gal.build_lookup_grid(cell_size=0.1)
+    rng = np.random.default_rng(1)
+    x_rand = rng.uniform(-18, 18, 100000)
+    y_rand = rng.uniform(-18, 18, 100000)
+    assert np.array_equal(
+        gal.isOnSpiralArmOrSpurBatch(x_rand, y_rand, use_lookup_grid=True),
+        gal.isOnSpiralArmOrSpurBatch(x_rand, y_rand))
+    # coordinates exactly on the cell edges
+    x_edge, y_edge = np.meshgrid(np.arange(-16, 16, 0.1),
+                                 np.arange(-16, 16, 0.1))
+    assert np.array_equal(
+        gal.isOnSpiralArmOrSpurBatch(x_edge, y_edge, use_lookup_grid=True),
+        gal.isOnSpiralArmOrSpurBatch(x_edge, y_edge))
+    print("Test on_anything_lookup_grid passed!")
+
+
+def test_geometry_cache():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        gal_cold = Galaxy(geometry_cache_dir=cache_dir)
+        assert len(os.listdir(cache_dir)) == len(gal_cold.spiral_arms)
+        gal_warm = Galaxy(geometry_cache_dir=cache_dir)
+    for arm_cold, arm_warm in zip(gal_cold.spiral_arms, gal_warm.spiral_arms):
+        assert repr(arm_cold) == repr(arm_warm)
+        # ThreeKpc arm has two (near/far) parts
+        names = ('x_spine', 'y_spine', '_poly_coords_inner',
+                 '_poly_coords_outer') if repr(arm_cold) == "ThreeKpc" \
+            else ('x_spine', 'y_spine', '_poly_coords')
+        for name in names:
+            parts_cold = getattr(arm_cold, name)
+            parts_warm = getattr(arm_warm, name)
+            if not isinstance(parts_cold, list):
+                parts_cold, parts_warm = [parts_cold], [parts_warm]
+            assert len(parts_cold) == len(parts_warm)
+            for part_cold, part_warm in zip(parts_cold, parts_warm):
+                assert np.array_equal(part_cold, part_warm)
+    for name, poly in gal._spiral_arm_polygons.items():
+        assert poly.equals(gal_warm._spiral_arm_polygons[name])
+    x = [6.5, 0.5, -2.27, 1.54]
+    y = [1, 10, 4.62, 4.35]
+    assert gal_warm.isOnSpiralArmOrSpur(x, y) == [0, 1, 2, 3]
+    # an unwritable cache directory only warns
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        not_a_dir = os.path.join(tmp_dir, "file")
+        open(not_a_dir, 'w').close()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            gal_uncached = Galaxy(geometry_cache_dir=not_a_dir)
+        assert any("Could not cache" in str(warning.message)
+                   for warning in caught)
+    assert gal_uncached.isOnSpiralArmOrSpur(x, y) == [0, 1, 2, 3]
+    print("Test geometry_cache passed!")
+
+
+def test_headless_classification():
+    # classification alone should not import the plotting stack
+    code = ("import sys; from galaxy_model.galaxy import Galaxy; "
+            "Galaxy().isOnSpiralArmOrSpurBatch([0.5], [10]); "
+            "assert 'matplotlib' not in sys.modules; "
+            "assert 'descartes' not in sys.modules")
+    subprocess.run([sys.executable, "-c", code], check=True,
+                   cwd=os.path.join(os.path.dirname(__file__), '..'))
+    print("Test headless_classification passed!")
+
+
+def test_on_anything_parallel():
+    rng = np.random.default_rng(2)
+    x_rand = rng.uniform(-16, 16, 20000)
+    y_rand = rng.uniform(-16, 16, 20000)
+    assert np.array_equal(
+        gal.isOnSpiralArmOrSpurParallel(x_rand, y_rand, processes=2,
+                                        chunk_size=3000),
+        gal.isOnSpiralArmOrSpurBatch(x_rand, y_rand))
+    # from a thread (e.g. the classification service), the workers are not
+    # forked
+    results = []
+    thread = threading.Thread(target=lambda: results.append(
+        gal.isOnSpiralArmOrSpurParallel(x_rand, y_rand, processes=2,
+                                        chunk_size=10000)))
+    thread.start()
+    thread.join()
+    assert np.array_equal(results[0],
+                          gal.isOnSpiralArmOrSpurBatch(x_rand, y_rand))
+    # the sources and the plotting state are not pickled
+    gal_sources = Galaxy()
+    gal_sources.add_coord(x_rand, y_rand)
+    gal_unpickled = pickle.loads(pickle.dumps(gal_sources))
+    assert gal_unpickled.isOnSpiralArmOrSpur([6.5, 0.5, -2.27, 1.54],
+                                             [1, 10, 4.62, 4.35]) == \
+        [0, 1, 2, 3]
+    assert len(gal_unpickled.src_x_coords) == 0
+    assert len(gal_unpickled._background_cache) == 0
+    print("Test on_anything_parallel passed!")
+
+
+def test_arm_local_coordinates():
+    local_arm = [arm for arm in gal.spiral_arms if repr(arm) == "Local"][0]
+    x_spine = np.asarray(local_arm.x_spine[30:40])
+    y_spine = np.asarray(local_arm.y_spine[30:40])
+    on_spine = gal.armLocalCoordinates(x_spine, y_spine)
+    assert (on_spine['arm'] == "Local").all()
+    assert np.allclose(on_spine['offset_kpc'], 0)
+    assert np.allclose(on_spine['B'], local_arm._B_spine[30:40])
+    # points shifted radially outwards/inwards by 0.1 kpc
+    r = np.hypot(x_spine, y_spine)
+    outer = gal.armLocalCoordinates(x_spine*(r+0.1)/r, y_spine*(r+0.1)/r)
+    inner = gal.armLocalCoordinates(x_spine*(r-0.1)/r, y_spine*(r-0.1)/r)
+    assert (outer['offset_kpc'] > 0.09).all()
+    assert (inner['offset_kpc'] < -0.09).all()
+    assert (np.abs(outer['offset_width']) < 1).all()
+    # random points: the offset is the distance from the nearest spine
+    rng = np.random.default_rng(4)
+    x_rand = rng.uniform(-16, 16, 300)
+    y_rand = rng.uniform(-16, 16, 300)
+    spines = []
+    for arm in gal.spiral_arms:
+        parts = zip(arm.x_spine, arm.y_spine) if repr(arm) == "ThreeKpc" \
+            else [(arm.x_spine, arm.y_spine)]
+        spines += [(repr(arm), LineString(np.column_stack(part)))
+                   for part in parts]
+    distances = np.array([[spine.distance(Point(x, y)) for _, spine in spines]
+                          for x, y in zip(x_rand, y_rand)])
+    nearest_arm = np.array([name for name, _ in spines])[
+        np.argmin(distances, axis=1)]
+    random = gal.armLocalCoordinates(x_rand, y_rand)
+    assert np.allclose(np.abs(random['offset_kpc']), distances.min(axis=1))
+    assert (random['arm'] == nearest_arm).all()
+    # chunked queries give the same result
+    chunked = ArmCoordinateIndex(gal.spiral_arms, chunk_size=7).query(
+        x_rand, y_rand)
+    assert all(np.array_equal(chunked[key], random[key]) for key in random)
+    print("Test arm_local_coordinates passed!")
+
+
+def test_sweep_parameters():
+    rng = np.random.default_rng(3)
+    x_rand = rng.uniform(-16, 16, 20000)
+    y_rand = rng.uniform(-16, 16, 20000)
+    variants = [{}, {'Local': {'psi': -10}}, {'Local': {'psi': -13}},
+                {'Norma': {'w-kink': 0.2}, 'Outer': {'sigma': 2}}]
+    results = gal.sweepParameters(variants, x_rand, y_rand)
+    assert results.shape == (len(variants), 20000)
+    for param_overrides, result in zip(variants, results):
+        gal_variant = Galaxy(param_overrides=param_overrides)
+        assert np.array_equal(
+            result, gal_variant.isOnSpiralArmOrSpurBatch(x_rand, y_rand))
+    assert (results[1] != results[0]).any()
+    # misspelt parameter dict names are not silently ignored
+    for build in (lambda: Galaxy(param_overrides={'Loacl': {'psi': -10}}),
+                  lambda: gal.sweepParameters([{'Loacl': {'psi': -10}}],
+                                              x_rand, y_rand)):
+        try:
+            build()
+            assert False
+        except AssertionError as error:
+            assert "Loacl" in str(error)
+    print("Test sweep_parameters passed!")
+
+
+def test_level_of_detail():
+    # full detail: no error
+    report = gal.levelOfDetail()
+    assert all(row['boundary_error_kpc'] == 0 for row in report.values())
+    # simplified polygons stay within the requested error (up to the
+    # sampling of the boundary error)
+    gal_simplified = Galaxy(max_boundary_error=0.02)
+    for name, row in gal_simplified.levelOfDetail().items():
+        assert row['vertices'] < row['reference_vertices']
+        assert row['boundary_error_kpc'] < 0.02 + 0.0025
+    rng = np.random.default_rng(4)
+    x_rand = rng.uniform(-16, 16, 20000)
+    y_rand = rng.uniform(-16, 16, 20000)
+    differ = gal_simplified.locationBitmask(x_rand, y_rand) \
+        != gal.locationBitmask(x_rand, y_rand)
+    assert 0 < differ.sum() < 0.01 * len(x_rand)
+    # the reference is never simplified
+    assert gal_simplified.levelOfDetail(reference=gal_simplified) == \
+        gal_simplified.levelOfDetail()
+    # coarser angular resolution: fewer vertices, bigger error
+    gal_coarse = Galaxy(angular_step=3)
+    report_coarse = gal_coarse.levelOfDetail()
+    for name, row in report_coarse.items():
+        assert row['vertices'] < report[name]['vertices'] / 2
+        assert 0 < row['boundary_error_kpc'] < 0.5
+    assert gal_coarse.levelOfDetail(reference=gal) == report_coarse
+    # evenly spaced samples over the whole range, also for the ThreeKpc
+    # parts (the range of the far part, 140 deg, is no multiple of 3 deg),
+    # whose end is not sampled
+    three_kpc = gal_coarse.spiral_arms[0]
+    for B_spine, end in zip(three_kpc._B_spine,
+                            (three_kpc.params['B-end-near'],
+                             three_kpc.params['B-end-far'])):
+        spacing = np.diff(B_spine)
+        assert np.allclose(spacing, spacing[0])
+        assert abs(spacing[0] - 3) < 0.1
+        assert np.isclose(B_spine[-1] + spacing[0], end)
+    assert np.array_equal(
+        gal_coarse.sweepParameters([{}], x_rand, y_rand)[0],
+        gal_coarse.isOnSpiralArmOrSpurBatch(x_rand, y_rand))
+    print("Test level_of_detail passed!")
+
+
+def test_instrumentation():
+    calls = []
+    instrumentation = Instrumentation(
+        callback=lambda stage, name, elapsed_s: calls.append((stage, name)))
+    gal_instrumented = Galaxy(instrumentation=instrumentation)
+    gal_instrumented.isOnSpiralArmOrSpur([0.5, -2.27], [10, 4.62])
+    gal_instrumented.isOnSpiralArmOrSpurBatch([0.5], [10])
+    report = instrumentation.report()
+    assert len(calls) == sum(row['calls'] for row in report)
+    stages = {(row['stage'], row['name']): row for row in report}
+    for stage in ('spine', 'smoothing', 'borders', 'polygon',
+                  'contains_batch'):
+        assert stages[(stage, 'NormaOuter')]['calls'] == 1
+    assert ('smoothing', 'ThreeKpc') not in stages
+    assert stages[('contains', 'Perseus')]['calls'] >= 1
+    # the (analytic) spurs are checked for every coordinate
+    assert stages[('contains', 'Spur0')]['calls'] == 2
+    assert stages[('contains_batch', 'Spur3')]['total_s'] >= 0
+    instrumentation.reset()
+    assert instrumentation.report() == []
+    print("Test instrumentation passed!")
+
+
 if __name__ == "__main__":
     test_add_and_remove_coords()
+    test_add_and_remove_coords_bulk()
     test_plot_galaxy_basic()
+    test_plot_galaxy_density()
+    test_plot_galaxy_cached_background()
+    test_plot_galaxy_interactive()
+    test_spine_radius_and_width_vectorized()
     test_on_spur()
     test_on_spiral_arm()
     test_on_anything()
+    test_on_anything_batch()
+    test_on_bar()
+    test_location_bitmask()
+    test_on_anything_lookup_grid()
+    test_geometry_cache()
+    test_headless_classification()
+    test_on_anything_parallel()
+    test_arm_local_coordinates()
+    test_sweep_parameters()
+    test_level_of_detail()
+    test_instrumentation()
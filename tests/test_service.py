@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                '..')))
+
+from galaxy_model.galaxy import Galaxy # noqa
+from galaxy_model.service import ClassificationService # noqa
+from galaxy_model.service_client import ClassificationClient # noqa
+
+gal = Galaxy()
+rng = np.random.default_rng(5)
+x_rand = rng.uniform(-16, 16, 2000)
+y_rand = rng.uniform(-16, 16, 2000)
+
+
+def _run_service(service, **address):
+    # the service runs on an event loop in a background thread; returns a
+    # function stopping it
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(service.start(**address), loop).result()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(service.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+    return stop
+
+
+def test_service_unix_socket():
+    service = ClassificationService(gal, max_delay_s=0.2)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = os.path.join(tmp_dir, "galaxy_model.sock")
+        stop = _run_service(service, socket_path=socket_path)
+        try:
+            results = {}
+
+            def classify(i):
+                with ClassificationClient(socket_path=socket_path) as client:
+                    results[i] = client.classify(x_rand[i::4], y_rand[i::4])
+
+            # concurrent requests are classified in shared batches
+            threads = [threading.Thread(target=classify, args=(i,))
+                       for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for i in range(4):
+                assert np.array_equal(
+                    results[i],
+                    gal.isOnSpiralArmOrSpurBatch(x_rand[i::4], y_rand[i::4]))
+            assert service.stats['requests'] == 4
+            assert service.stats['batches'] < 4
+
+            with ClassificationClient(socket_path=socket_path) as client:
+                bitmask = client.location_bitmask(x_rand.reshape(40, 50),
+                                                  y_rand.reshape(40, 50))
+                assert np.array_equal(
+                    bitmask, gal.locationBitmask(x_rand.reshape(40, 50),
+                                                 y_rand.reshape(40, 50)))
+                assert client.info()['location_names'] == gal.location_names
+                # invalid requests get an error, the connection stays open
+                try:
+                    client._request('classify', x=[0.5, 1], y=[10])
+                    assert False
+                except RuntimeError as error:
+                    assert "differ in length" in str(error)
+                assert client.classify([0.5], [10]).tolist() == [1]
+        finally:
+            stop()
+        assert not os.path.exists(socket_path)
+    print("Test service_unix_socket passed!")
+
+
+def test_service_tcp():
+    service = ClassificationService(gal, max_delay_s=0,
+                                    use_lookup_grid=True)
+    stop = _run_service(service, port=0)
+    try:
+        host, port = service.address
+        with ClassificationClient(host=host, port=port) as client:
+            assert np.array_equal(client.classify(x_rand, y_rand),
+                                  gal.isOnSpiralArmOrSpurBatch(x_rand, y_rand))
+    finally:
+        stop()
+    print("Test service_tcp passed!")
+
+
+def test_service_limits():
+    service = ClassificationService(gal, max_delay_s=0, max_request_bytes=1000,
+                                    max_pending_requests=2)
+    stop = _run_service(service, port=0)
+    try:
+        host, port = service.address
+        with ClassificationClient(host=host, port=port) as client:
+            # a request longer than max_request_bytes is answered with an
+            # error, the connection stays open
+            try:
+                client.classify(x_rand, y_rand)
+                assert False
+            except RuntimeError as error:
+                assert "longer than 1000 bytes" in str(error)
+            assert client.classify([0.5], [10]).tolist() == [1]
+        # pipelined requests beyond max_pending_requests wait to be read
+        with socket.create_connection((host, port)) as sock:
+            requests = [{'id': i, 'op': 'classify', 'x': [x_rand[i]],
+                         'y': [y_rand[i]]} for i in range(20)]
+            sock.sendall(b"".join(json.dumps(request).encode() + b"\n"
+                                  for request in requests))
+            with sock.makefile('rb') as f:
+                responses = [json.loads(f.readline()) for _ in requests]
+        assert sorted(response['id'] for response in responses) == \
+            list(range(20))
+        for response in responses:
+            i = response['id']
+            assert response['result'] == gal.isOnSpiralArmOrSpurBatch(
+                x_rand[i:i+1], y_rand[i:i+1]).tolist()
+    finally:
+        stop()
+    print("Test service_limits passed!")
+
+
+if __name__ == "__main__":
+    test_service_unix_socket()
+    test_service_tcp()
+    test_service_limits()
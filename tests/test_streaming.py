@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                '..')))
+
+from galaxy_model.galaxy import Galaxy # noqa
+from galaxy_model.coordinates import heliocentric_to_galactocentric # noqa
+from galaxy_model.streaming import classify_file, classify_npy_file # noqa
+
+gal = Galaxy()
+rng = np.random.default_rng(3)
+x_rand = rng.uniform(-16, 16, 2500)
+y_rand = rng.uniform(-16, 16, 2500)
+
+
+def test_classify_csv_file():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "catalogue.csv")
+        np.savetxt(path, np.column_stack((np.arange(2500), x_rand, y_rand)),
+                   delimiter=',', header="id,x,y", comments='')
+        chunks = list(classify_file(gal, path, chunk_size=1000))
+        # quoted and space-padded header names
+        np.savetxt(path, np.column_stack((np.arange(2500), x_rand, y_rand)),
+                   delimiter=',', header='"id", "x", "y"', comments='')
+        quoted_chunks = list(classify_file(gal, path, chunk_size=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    assert np.array_equal(np.concatenate(chunks),
+                          gal.isOnSpiralArmOrSpurBatch(x_rand, y_rand))
+    assert np.array_equal(np.concatenate(quoted_chunks),
+                          np.concatenate(chunks))
+    print("Test classify_csv_file passed!")
+
+
+def test_classify_npy_file():
+    glon = rng.uniform(0, 360, 2500)
+    glat = rng.uniform(-1, 1, 2500)
+    dist = rng.uniform(0.1, 15, 2500)
+    x, y, _ = heliocentric_to_galactocentric(glon, glat, dist)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "catalogue.npy")
+        np.save(path, np.column_stack((glon, glat, dist)))
+        chunks = list(classify_file(gal, path, coords='lbd',
+                                    columns=(0, 1, 2), chunk_size=1000))
+        # the default columns of a plain array are the first ones
+        default_chunks = list(classify_file(gal, path, coords='lbd',
+                                            chunk_size=1000))
+        try:
+            list(classify_file(gal, path, columns=('glon', 'glat')))
+            assert False
+        except ValueError as error:
+            assert "by index" in str(error)
+    assert np.array_equal(np.concatenate(chunks),
+                          gal.isOnSpiralArmOrSpurBatch(x, y))
+    assert np.array_equal(np.concatenate(default_chunks),
+                          np.concatenate(chunks))
+    print("Test classify_npy_file passed!")
+
+
+def test_classify_memmap():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "catalogue.npy")
+        out_path = os.path.join(tmp_dir, "locations.npy")
+        np.save(path, np.column_stack((x_rand, y_rand)))
+        out = classify_npy_file(gal, path, out_path, columns=(0, 1),
+                                chunk_size=1000)
+        assert isinstance(out, np.memmap)
+        del out
+        locations = np.load(out_path)
+    assert np.array_equal(locations,
+                          gal.isOnSpiralArmOrSpurBatch(x_rand, y_rand))
+    print("Test classify_memmap passed!")
+
+
+if __name__ == "__main__":
+    test_classify_csv_file()
+    test_classify_npy_file()
+    test_classify_memmap()